@@ -0,0 +1,140 @@
+import os
+import json
+import warnings
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from main import build_parser, prepare_data
+from infer import load_trained, embed, known_edges
+from telemetry import telemetry
+from utils import contains_keys, query_blocks
+
+# manifest entries a resumed run must agree on
+RESUME_KEYS = ['num_nodes', 'dtype', 'checkpoint', 'known_masked']
+
+
+def pair_offset(i, j, num_nodes):
+    # position of pair (i, j), i < j, in the row-major packed upper triangle
+    return i * num_nodes - i * (i + 1) // 2 + (j - i - 1)
+
+
+def open_scores(path, mode='r'):
+    # the float16 triangle of a run as a memmap, plus its manifest
+    with open(path + '.json') as f:
+        manifest = json.load(f)
+    n = manifest['num_nodes']
+    return np.memmap(path, dtype=np.float16, mode=mode, shape=(n * (n - 1) // 2,)), manifest
+
+
+class PairScorer(object):
+    # Scores the (i, j>i) upper triangle tile by tile into a float16 memmap.
+    # Tiles are rows [r, r+R) x columns [c, c+B) that hold at least one pair
+    # with j > i. A uint8 bitmap next to the scores marks finished tiles and is
+    # only set after the tile's scores are flushed, so an interrupted run picks
+    # up where it stopped, with the tile sizes it was started with. Known
+    # edges get NaN unless keep_known.
+    def __init__(self, path, predictor, h, row_block, col_block, known_keys=None, meta=None):
+        self.path = path
+        self.predictor = predictor
+        self.h = h
+        self.num_nodes = n = h[0].size(0)
+        self.known_keys = known_keys
+        manifest = dict(num_nodes=n, row_block=row_block, col_block=col_block, dtype='float16', **(meta or {}))
+
+        if os.path.exists(path + '.json'):
+            with open(path + '.json') as f:
+                old = json.load(f)
+            changed = [key for key in RESUME_KEYS if old.get(key) != manifest.get(key)]
+            if changed:
+                raise ValueError(f'{path} was started with different {changed}: {old}')
+            # the tile sizes only set speed and memory; a resumed run keeps those its bitmap was built with
+            row_block, col_block = old['row_block'], old['col_block']
+            mode = 'r+'
+        else:
+            mode = 'w+'
+        self.row_block, self.col_block = row_block, col_block
+        self.tiles = [(r, c) for r in range(0, n, row_block) for c in range(0, n, col_block)
+                      if c + col_block > r + 1]
+        self.scores = np.memmap(path, dtype=np.float16, mode=mode, shape=(n * (n - 1) // 2,))
+        self.done = np.memmap(path + '.done', dtype=np.uint8, mode=mode, shape=(len(self.tiles),))
+        if mode == 'w+':
+            self.done.flush()
+            with open(path + '.json', 'w') as f:
+                json.dump(manifest, f, indent=1)
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        return [t for t, done in enumerate(self.done) if not done]
+
+    @torch.no_grad()
+    def score_tile(self, t):
+        r, c = self.tiles[t]
+        n = self.num_nodes
+        rows = torch.arange(r, min(r + self.row_block, n))
+        cols = torch.arange(c, min(c + self.col_block, n))
+        folded = self.predictor.fold_query(self.h, rows)
+        s = self.predictor.score_folded(folded, self.h, cols)
+        if self.known_keys is not None:
+            lo = torch.min(rows.view(-1, 1), cols.view(1, -1))
+            hi = torch.max(rows.view(-1, 1), cols.view(1, -1))
+            s.masked_fill_(contains_keys(self.known_keys, lo * n + hi), float('nan'))
+        s = s.cpu().numpy().astype(np.float16)
+        # every row's j > i part of the tile is one contiguous run of the triangle
+        for k, i in enumerate(range(rows[0].item(), rows[-1].item() + 1)):
+            start = max(c, i + 1)
+            if start >= cols[-1].item() + 1:
+                continue
+            at = pair_offset(i, start, n)
+            self.scores[at:at + cols[-1].item() + 1 - start] = s[k, start - c:]
+        return t
+
+    def mark(self, t):
+        with self.lock:
+            self.scores.flush()
+            self.done[t] = 1
+            self.done.flush()
+
+    def run(self, workers=1):
+        todo = self.remaining()
+        if workers <= 1:
+            for t in todo:
+                self.mark(self.score_tile(t))
+                telemetry.count('allpairs.tiles')
+            return len(todo)
+        with ThreadPoolExecutor(workers) as pool:
+            for t in pool.map(self.score_tile, todo):
+                self.mark(t)
+                telemetry.count('allpairs.tiles')
+        return len(todo)
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.add_argument('--checkpoint', type=str, required=True,
+                        help='run checkpoint prefix, e.g. checkpoints/hd_<run_tag>_run00')
+    parser.add_argument('--out', type=str, default='scores.f16', help='packed upper-triangle output, resumed if present')
+    parser.add_argument('--workers', type=int, default=4, help='scoring threads')
+    parser.add_argument('--keep_known', action='store_true', help='also score pairs that are already edges')
+    warnings.simplefilter('ignore')
+    args = parser.parse_args()
+    telemetry.configure(args.telemetry, sample_memory=args.sample_memory)
+    # the worker threads share the cores instead of each running a full intra-op pool
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, args.workers)))
+
+    data, train_adj, split_edge = prepare_data(args.data_name, args)
+    model, predictor = load_trained(args, data, args.checkpoint)
+    with telemetry.timer('encode'):
+        h = embed(model, data, train_adj, args)
+    h = [x.cpu() for x in h]
+    predictor = predictor.cpu()
+
+    known = None if args.keep_known else known_edges(split_edge, data.num_nodes)
+    budget = args.eval_mem_mb * 2**20 // max(1, args.workers)
+    row_block, col_block = query_blocks(predictor, h, data.num_nodes, budget)
+    meta = dict(data_name=args.data_name, checkpoint=os.path.abspath(args.checkpoint), known_masked=known is not None)
+    scorer = PairScorer(args.out, predictor, h, row_block, col_block, known, meta)
+    with telemetry.timer('allpairs', tiles=len(scorer.tiles)):
+        scored = scorer.run(args.workers)
+    telemetry.flush()
+    print(f'{scored} of {len(scorer.tiles)} tiles scored -> {args.out}')
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import argparse
+import subprocess
+import warnings
+import torch
+from torch_geometric.data import Data
+from torch_geometric.utils import to_undirected
+from model import GCN_mgae, LPD, FusedLPD
+from main import build_parser, getPreEmbedding, train, train_minibatch, test
+from telemetry import PeakRSS
+from utils import sample_neg_edges, enumerate_neg_edges, edge_split_direct, TrainAdjacency, random_edge_mask
+
+STAGES = ['stage1', 'negatives', 'split', 'adjacency', 'mask', 'train', 'test']
+
+
+def synthetic_dataset(num_gene, num_aux, assoc_degree, interact_degree, interact_density=0.0, seed=0):
+    # Same layout as datasets/<name>.pt: aux ids in associated_to are offset by
+    # num_gene, interacts holds distinct gene pairs. Aux popularity is skewed
+    # (Zipf-like) as in the real annotation sets.
+    generator = torch.Generator().manual_seed(seed)
+    num_assoc = min(int(num_gene * assoc_degree), num_gene * num_aux)
+    weights = torch.arange(1, num_aux + 1).float().pow(-0.8)
+    gene = torch.randint(num_gene, (num_assoc,), generator=generator)
+    aux = torch.multinomial(weights, num_assoc, replacement=True, generator=generator)
+    keys = torch.unique(gene * num_aux + aux)
+    associated_to = torch.stack([keys // num_aux, keys % num_aux + num_gene], dim=0)
+
+    if interact_density > 0:
+        num_interacts = int(interact_density * num_gene * (num_gene - 1) / 2)
+    else:
+        num_interacts = int(interact_degree * num_gene / 2)
+    interacts = sample_neg_edges(torch.empty(0, dtype=torch.long), num_gene, num_interacts, generator)
+    return {
+        'gene': {'node_id': torch.arange(num_gene)},
+        'aux': {'node_id': torch.arange(num_aux)},
+        'associated_to': {'edge_index': associated_to},
+        'interacts': {'edge_index': interacts},
+    }
+
+
+def measure(record, name, rss, fn, repeats=1):
+    # runs fn repeats times; keeps the total and the slowest window's peak RSS
+    times, peak = [], 0
+    for _ in range(repeats):
+        key = rss.start()
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+        peak = max(peak, rss.stop(key))
+    record[name] = dict(seconds=sum(times), mean=sum(times) / len(times), repeats=repeats,
+                        peak_rss_mb=peak / 2**20)
+    return out
+
+
+def bench_size(num_gene, bench_args, args, rss):
+    num_aux = int(num_gene * bench_args.aux_ratio)
+    torch.manual_seed(args.seed)
+    dataset = synthetic_dataset(num_gene, num_aux, bench_args.assoc_degree, bench_args.interact_degree,
+                                bench_args.interact_density, args.seed)
+    stages = bench_args.stages.split(',')
+    record = dict()
+    result = dict(num_gene=num_gene, num_aux=num_aux,
+                  num_associated=dataset['associated_to']['edge_index'].size(1),
+                  num_interacts=dataset['interacts']['edge_index'].size(1), stages=record)
+
+    if 'stage1' in stages:
+        hparams = dict(mode=args.stage1_mode, epochs=bench_args.stage1_epochs)
+        embeddings = measure(record, 'stage1', rss, lambda: getPreEmbedding(dataset, 128, args.seed, None, hparams))
+    else:
+        embeddings = torch.rand(num_gene, 128)
+
+    data = Data()
+    data.num_nodes = num_gene
+    data.edge_index = dataset['interacts']['edge_index']
+    data.x = embeddings
+    data.num_features = 128
+    data.edge_attr = None
+    if 'negatives' in stages:
+        measure(record, 'negatives', rss, lambda: enumerate_neg_edges(data.edge_index, num_gene))
+    split_edge = measure(record, 'split', rss, lambda: edge_split_direct(data))
+    data.edge_index = to_undirected(split_edge['train']['edge'].t())
+    train_adj = measure(record, 'adjacency', rss, lambda: TrainAdjacency(split_edge['train']['edge'], num_gene))
+    if 'mask' in stages:
+        measure(record, 'mask', rss, lambda: random_edge_mask(args, split_edge, data.x.device, num_gene, train_adj),
+                bench_args.repeats)
+
+    if 'train' in stages or 'test' in stages:
+        decoder = FusedLPD if args.fused_decoder else LPD
+        predictor = decoder(args.hidden_channels, args.decode_channels, 1, args.num_layers, args.decode_layers, args.dropout)
+        model = GCN_mgae(data.num_features, args.hidden_channels, args.hidden_channels, args.num_layers, args.dropout,
+                         decoder_mask=args.decoder_mask, num_nodes=num_gene)
+        optimizer = torch.optim.Adam(list(model.parameters()) + list(predictor.parameters()), lr=args.lr)
+        step = train_minibatch if args.minibatch else train
+        if 'train' in stages:
+            measure(record, 'train', rss, lambda: step(model, predictor, data, split_edge, optimizer, args, train_adj),
+                    bench_args.repeats)
+        if 'test' in stages:
+            adj = train_adj.adj()[0]
+            measure(record, 'test', rss, lambda: test(model, predictor, data, adj, split_edge, args), bench_args.repeats)
+    return result
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='HyperSSL scaling benchmark; other flags go to main.py\'s parser')
+    parser.add_argument('--genes', type=str, default='500,1000,2000,4000', help='comma separated gene counts')
+    parser.add_argument('--aux_ratio', type=float, default=5.7, help='aux nodes per gene')
+    parser.add_argument('--assoc_degree', type=float, default=37.0, help='aux associations per gene')
+    parser.add_argument('--interact_degree', type=float, default=6.0, help='mean gene-gene degree')
+    parser.add_argument('--interact_density', type=float, default=0.0, help='fraction of gene pairs that interact, overrides --interact_degree')
+    parser.add_argument('--stage1_epochs', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=3, help='repetitions of the per-epoch stages')
+    parser.add_argument('--stages', type=str, default=','.join(STAGES))
+    parser.add_argument('--out', type=str, default='bench.json')
+    bench_args, rest = parser.parse_known_args()
+    args = build_parser().parse_args(rest)
+    warnings.simplefilter('ignore')
+
+    rss = PeakRSS()
+    results = []
+    for num_gene in [int(n) for n in bench_args.genes.split(',')]:
+        result = bench_size(num_gene, bench_args, args, rss)
+        results.append(result)
+        print(num_gene, ' '.join(f"{name}={stage['mean']:.3f}s/{stage['peak_rss_mb']:.0f}MB"
+                                 for name, stage in result['stages'].items()))
+    rss.close()
+
+    report = dict(commit=git_commit(), created=time.strftime('%Y-%m-%dT%H:%M:%S'), torch=torch.__version__,
+                  threads=torch.get_num_threads(), bench=vars(bench_args), args=vars(args), results=results)
+    with open(bench_args.out, 'w') as f:
+        json.dump(report, f, indent=1)
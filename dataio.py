@@ -0,0 +1,76 @@
+import os
+import json
+import argparse
+import numpy as np
+import torch
+
+# the only parts of the pickled HeteroData that HyperSSL reads
+NODE_TYPES = ['gene', 'aux']
+EDGE_TYPES = ['associated_to', 'interacts']
+
+
+class CompactDataset(object):
+    # Read-only view of a converted dataset directory. Edge arrays are
+    # memory-mapped on first access and wrapped as tensors without a copy, so
+    # concurrent jobs share the page cache. Indexing mirrors the HeteroData
+    # access used in main: dataset['gene']['node_id'],
+    # dataset['interacts']['edge_index'].
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.cache = dict()
+
+    def __getitem__(self, key):
+        if key in self.manifest['num_nodes']:
+            return {'node_id': torch.arange(self.manifest['num_nodes'][key])}
+        if key in self.manifest['edges']:
+            if key not in self.cache:
+                entry = self.manifest['edges'][key]
+                array = np.load(os.path.join(self.path, entry['file']), mmap_mode='c')
+                assert list(array.shape) == entry['shape'], f'{key}: shape does not match the manifest'
+                self.cache[key] = torch.from_numpy(array)
+            return {'edge_index': self.cache[key]}
+        raise KeyError(key)
+
+
+def load_pickled(name, root='datasets'):
+    # the shipped HeteroData pickle; a trusted file, so full unpickling is allowed
+    return torch.load(os.path.join(root, f'{name}.pt'), weights_only=False)
+
+
+def convert(name, root='datasets'):
+    # writes datasets/<name>/ with one .npy per edge type and a manifest.json
+    dataset = load_pickled(name, root)
+    out = os.path.join(root, name)
+    os.makedirs(out, exist_ok=True)
+    manifest = dict(format=1, source=f'{name}.pt', num_nodes=dict(), edges=dict())
+    for node_type in NODE_TYPES:
+        manifest['num_nodes'][node_type] = len(dataset[node_type]['node_id'])
+    for edge_type in EDGE_TYPES:
+        edge_index = dataset[edge_type]['edge_index'].cpu().long().contiguous().numpy()
+        np.save(os.path.join(out, f'{edge_type}.npy'), edge_index)
+        manifest['edges'][edge_type] = dict(file=f'{edge_type}.npy', shape=list(edge_index.shape),
+                                            dtype=str(edge_index.dtype))
+    tmp = os.path.join(out, 'manifest.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(out, 'manifest.json'))
+    return out
+
+
+def load_dataset(name, root='datasets'):
+    # the compact directory when it has been converted, the pickled .pt otherwise
+    path = os.path.join(root, name)
+    if os.path.exists(os.path.join(path, 'manifest.json')):
+        return CompactDataset(path)
+    return load_pickled(name, root)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert datasets to the memory-mapped format')
+    parser.add_argument('names', nargs='+', help='t2d, pd, hd, sch')
+    parser.add_argument('--root', type=str, default='datasets')
+    args = parser.parse_args()
+    for name in args.names:
+        print(convert(name, args.root))
@@ -0,0 +1,60 @@
+import time
+import torch
+
+SPMM_BACKENDS = ['torch_sparse', 'torch_csr']
+
+
+class PrecisionWarning(UserWarning):
+    # the --fast_cpu path drifted from the fp32 eager reference
+    pass
+
+
+def configure_threads(intra_threads=0, interop_threads=0):
+    # 0 keeps torch's default; the inter-op pool can only be sized before its first use
+    if intra_threads:
+        torch.set_num_threads(intra_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            pass
+
+
+def to_backend(adj, backend):
+    # the normalized SparseTensor as the layout the GCNConv propagation should use
+    if backend == 'torch_csr':
+        return adj.to_torch_sparse_csr_tensor()
+    return adj
+
+
+@torch.no_grad()
+def pick_backend(adj, x, repeats=3):
+    # the faster propagation for this graph and feature width
+    best, best_time = None, float('inf')
+    for backend in SPMM_BACKENDS:
+        a = to_backend(adj, backend)
+        spmm = (lambda: a @ x) if backend == 'torch_sparse' else (lambda: torch.sparse.mm(a, x))
+        spmm()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            spmm()
+        elapsed = time.perf_counter() - start
+        if elapsed < best_time:
+            best, best_time = backend, elapsed
+    return best
+
+
+def compile_module(module):
+    # compiled in place, so parameters and state_dict keys stay as they are
+    module.compile(dynamic=True)
+    return module
+
+
+def decoder_autocast(enabled):
+    # bfloat16 for the dense decoder MLP only; the sparse propagation stays in fp32
+    return torch.autocast('cpu', dtype=torch.bfloat16, enabled=enabled)
+
+
+def eager_reference():
+    # runs compiled modules eagerly inside the block
+    return torch.compiler.set_stance('force_eager')
@@ -1,10 +1,13 @@
+import os
+import json
 import time
+import hashlib
 import torch
 import torch.optim as optim
 import torch.nn.functional as F
-from random import shuffle
-from dhg import Graph, Hypergraph
 from model import HGNNP
+from hypergraph import load_hypergraph
+from telemetry import telemetry
 from dhg.random import set_seed
 from dhg.metrics import HypergraphVertexClassificationEvaluator as Evaluator
 
@@ -33,86 +36,156 @@ def infer(net, X, G, lbls, idx, evaluator, test=False):
     return res
     
 
+def train_decoupled(net, PX, lbls, train_idx, optimizer, batch_size):
+    # mini-batch epoch of the head on precomputed propagated features
+    net.train()
+    total = 0
+    for idx in train_idx[torch.randperm(train_idx.numel())].split(batch_size):
+        optimizer.zero_grad()
+        loss = F.cross_entropy(net.forward_decoupled(PX[idx]), lbls[idx])
+        loss.backward()
+        optimizer.step()
+        total += loss.item() * idx.numel()
+    return total / max(1, train_idx.numel())
+
+
+@torch.no_grad()
+def infer_decoupled(net, PX, lbls, idx, evaluator, test=False):
+    net.eval()
+    outs = net.forward_decoupled(PX[idx])
+    if not test:
+        return evaluator.validate(lbls[idx], outs)
+    return evaluator.test(lbls[idx], outs)
+
+
 @torch.no_grad()
-def save_embedding(net,X,G,no_gene):
-    activation = {}
-    def get_activation(name):
-        def hook(model, input, output):
-            activation[name] = output.detach()
-        return hook   
+def save_embedding(net,X,G,no_gene,path=None):
     net.eval()  
-    net.lkc1.register_forward_hook(get_activation('lkc1'))
-    outs = net(X,G)
-    outs_first = activation['lkc1']
-    outs_first = outs_first[0:no_gene]
-    torch.save(outs_first,"prembed.pt") #input
-
-def HyperEmbedding(X,lbl,no_gene,Bipartite):
-    set_seed(2000)
+    outs_first = net.embed(X,G,slice(0,no_gene))
+    if path is not None:
+        torch.save(outs_first,path) #input
+    return outs_first
+
+
+# Stage 1 settings; all of them go into the embedding cache key
+HPARAMS = dict(seed=2000, lr=0.01, weight_decay=5e-4, epochs=200, train_ratio=0.6, val_ratio=0.2, k=1,
+               val_every=1, patience=0, mode='full', hops=1, batch_size=4096)
+
+
+def embedding_key(Bipartite, no_gene, no_aux, prembsize, seed, hparams=None):
+    h = hashlib.sha256()
+    h.update(Bipartite.detach().cpu().long().contiguous().numpy().tobytes())
+    meta = dict(no_gene=no_gene, no_aux=no_aux, prembsize=prembsize, seed=seed,
+                hparams=hparams or HPARAMS, version=2)
+    h.update(json.dumps(meta, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def load_cached_embedding(cache_dir, key, suffix=''):
+    path = os.path.join(cache_dir, 'stage1', key + suffix + '.pt')
+    if not os.path.exists(path):
+        return None
+    return torch.load(path)
+
+
+def save_cached_embedding(cache_dir, key, embeddings, suffix=''):
+    path = os.path.join(cache_dir, 'stage1', key + suffix + '.pt')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.%d.tmp' % os.getpid()
+    torch.save(embeddings, tmp)
+    os.replace(tmp, path)
+
+
+# the Stage 1 inputs and weights behind cached embeddings, for incremental updates
+def load_stage1_state(cache_dir, key):
+    return load_cached_embedding(cache_dir, key, '.state')
+
+
+def save_stage1_state(cache_dir, key, X, net, no_gene, no_aux, parent=None):
+    # parent is the key a warm-started entry was updated from
+    state = dict(X=X, net=net.state_dict(), no_gene=no_gene, no_aux=no_aux, parent=parent)
+    save_cached_embedding(cache_dir, key, state, '.state')
+
+
+def HyperEmbedding(X,lbl,no_gene,Bipartite,hparams=None,cache_dir=None,return_net=False):
+    hparams = dict(HPARAMS, **(hparams or {}))
+    set_seed(hparams['seed'])
     device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
     device = torch.device("cpu") 
     evaluator = Evaluator(["accuracy", "f1_score", {"f1_score": {"average": "micro"}}]) #exp
     
     
-    G = Graph(X.shape[0], Bipartite)
-    HG = Hypergraph.from_graph(G) #exp 
-    HG.add_hyperedges_from_graph_kHop(G, k=1)
+    # pair + k-hop neighbourhood hyperedges of the bipartite graph, cached by edge hash
+    with telemetry.timer('stage1.hypergraph'):
+        HG = load_hypergraph(X.shape[0], Bipartite, hparams['k'], cache_dir) #exp 
     
       
-    train_size = int(0.6*X.shape[0])
-    val_size = int(0.2*X.shape[0])
+    train_size = int(hparams['train_ratio']*X.shape[0])
+    val_size = int(hparams['val_ratio']*X.shape[0])
     #print("train_size,val_size: ",train_size,val_size)
     
-    train_mask = []
-    for i in range(X.shape[0]):
-      train_mask.append(False)
-    train_mask = torch.BoolTensor(train_mask)
-    for i in range(train_size):
-      train_mask[i]=True
-    
-    val_mask = []
-    for i in range(X.shape[0]):
-      val_mask.append(False)
-    val_mask = torch.BoolTensor(val_mask)
-    for i in range(train_size,train_size+val_size):
-      val_mask[i]=True
-      
-    test_mask = []
-    for i in range(X.shape[0]):
-      test_mask.append(False)
-    test_mask = torch.BoolTensor(test_mask)
-    for i in range(train_size+val_size,X.shape[0]):
-      test_mask[i]=True
-      
-    
-    ind_list = [i for i in range(X.shape[0])]
-    shuffle(ind_list)
-    train_mask = train_mask[ind_list]
-    val_mask = val_mask[ind_list]
-    test_mask = test_mask[ind_list]
+    perm = torch.randperm(X.shape[0])
+    train_mask = torch.zeros(X.shape[0], dtype=torch.bool)
+    train_mask[perm[:train_size]] = True
+    val_mask = torch.zeros(X.shape[0], dtype=torch.bool)
+    val_mask[perm[train_size:train_size+val_size]] = True
+    test_mask = torch.zeros(X.shape[0], dtype=torch.bool)
+    test_mask[perm[train_size+val_size:]] = True
     
     
     net = HGNNP(X.shape[1], X.shape[1], 2) 
-    optimizer = optim.Adam(net.parameters(), lr=0.01, weight_decay=5e-4)
+    optimizer = optim.Adam(net.parameters(), lr=hparams['lr'], weight_decay=hparams['weight_decay'])
     X, lbl = X.to(device), lbl.to(device) 
     HG = HG.to(device)
     net = net.to(device)
 
+    # decoupled mode: propagate once up front, then train the layers' linear maps in mini-batches
+    decoupled = hparams['mode'] == 'decoupled'
+    if decoupled:
+        with torch.no_grad(), telemetry.timer('stage1.propagate'):
+            PX = X
+            for _ in range(hparams['hops']):
+                PX = HG.v2v(PX, aggr="mean")
+        train_idx = train_mask.nonzero(as_tuple=False).view(-1)
+
     best_state = None
     best_epoch, best_val = 0, 0
-    path = "hgnnp_best_trained.model"
-    for epoch in range(200):
-        train(net, X, HG, lbl, train_mask, optimizer, epoch)
+    epochs, val_every, patience = hparams['epochs'], hparams['val_every'], hparams['patience']
+    for epoch in range(epochs):
+        with telemetry.timer('stage1.train', epoch=epoch):
+            if decoupled:
+                train_decoupled(net, PX, lbl, train_idx, optimizer, hparams['batch_size'])
+            else:
+                train(net, X, HG, lbl, train_mask, optimizer, epoch)
+        telemetry.count('stage1.epochs')
         # validation
-        if epoch % 1 == 0:
-            with torch.no_grad():
-                val_res = infer(net, X, HG, lbl, val_mask, evaluator)
-                if val_res > best_val:
-                    best_epoch = epoch
-                    best_val = val_res
-                    torch.save(net,path)
-    net = torch.load(path)
-    res = infer(net, X, HG, lbl, test_mask, evaluator, test=True)
-    save_embedding(net,X,HG,no_gene)
+        if epoch % val_every == 0 or epoch == epochs - 1:
+            with telemetry.timer('stage1.validate', epoch=epoch):
+                if decoupled:
+                    val_res = infer_decoupled(net, PX, lbl, val_mask, evaluator)
+                else:
+                    val_res = infer(net, X, HG, lbl, val_mask, evaluator)
+            if best_state is None or val_res > best_val:
+                best_epoch = epoch
+                best_val = val_res
+                best_state = {k: v.detach().clone() for k, v in net.state_dict().items()}
+            elif patience and epoch - best_epoch >= patience:
+                break
+    net.load_state_dict(best_state)
+    telemetry.event('stage1.best', epoch=best_epoch, val=float(best_val))
+    if decoupled:
+        res = infer_decoupled(net, PX, lbl, test_mask, evaluator, test=True)
+    else:
+        res = infer(net, X, HG, lbl, test_mask, evaluator, test=True)
+    if decoupled and hparams['hops'] != 1:
+        # the exported layer has to see the same P^hops X it was trained on
+        net.eval()
+        with torch.no_grad():
+            embeddings = net.embed_decoupled(PX, slice(0,no_gene))
+    else:
+        embeddings = save_embedding(net,X,HG,no_gene)
+    if return_net:
+        return embeddings, net
+    return embeddings
   
     
\ No newline at end of file
@@ -0,0 +1,116 @@
+import os
+import hashlib
+import numpy as np
+import scipy.sparse as ssp
+import torch
+
+
+def hyperedges_from_graph(num_v, edge_index, k=1):
+    # Hyperedges of Hypergraph.from_graph(G) + add_hyperedges_from_graph_kHop(G, k):
+    # every graph edge as a pair plus, per vertex, the vertex with its 1..k-hop
+    # neighbours, duplicates merged. Built with sparse matrix powers instead of a
+    # Python loop over vertices. Returns a CSR incidence (e_ptr, e_vert) with
+    # sorted members.
+    edge_index = torch.as_tensor(edge_index).cpu().long()
+    row, col = edge_index[0].numpy(), edge_index[1].numpy()
+    lo, hi = np.minimum(row, col), np.maximum(row, col)
+    keys = np.unique(lo[lo != hi] * num_v + hi[lo != hi])
+    a, b = keys // num_v, keys % num_v
+
+    ones = np.ones(2 * keys.size, dtype=np.int8)
+    A = ssp.csr_matrix((ones, (np.concatenate([a, b]), np.concatenate([b, a]))), shape=(num_v, num_v))
+    step = (A + ssp.identity(num_v, dtype=np.int8, format='csr')).astype(bool).astype(np.int8)
+    reach = step
+    for _ in range(k - 1):
+        reach = (reach @ step).astype(bool).astype(np.int8)
+    reach.sort_indices()
+
+    sizes = np.diff(reach.indptr)
+    groups = {2: [np.stack([a, b], axis=1)]}
+    for s in np.unique(sizes):
+        rows = np.nonzero(sizes == s)[0]
+        members = reach.indices[reach.indptr[rows][:, None] + np.arange(s)]
+        groups.setdefault(int(s), []).append(members)
+
+    e_ptr, e_vert = [np.zeros(1, dtype=np.int64)], []
+    offset = 0
+    for s in sorted(groups):
+        members = np.unique(np.concatenate(groups[s], axis=0).reshape(-1, s), axis=0)
+        e_vert.append(members.reshape(-1))
+        e_ptr.append(offset + s * np.arange(1, members.shape[0] + 1, dtype=np.int64))
+        offset += s * members.shape[0]
+    return torch.from_numpy(np.concatenate(e_ptr)), torch.from_numpy(np.concatenate(e_vert).astype(np.int64))
+
+
+class HyperOperator(object):
+    # Mean vertex-to-vertex propagation D_v^-1 H D_e^-1 H^T of a hypergraph with
+    # unit edge weights. This is the only structure op HGNNPConv needs
+    # (hg.v2v(X, aggr="mean")), so it stands in for a dhg.Hypergraph.
+    def __init__(self, num_v, e_ptr, e_vert, ve_value=None, ev_value=None):
+        self.num_v = num_v
+        self.num_e = e_ptr.numel() - 1
+        self.e_ptr, self.e_vert = e_ptr, e_vert.long()
+        e_size = torch.diff(e_ptr)
+        e_id = torch.repeat_interleave(torch.arange(self.num_e), e_size)
+        if ve_value is None:
+            ve_value = (1.0 / e_size.float())[e_id]
+        if ev_value is None:
+            v_deg = torch.bincount(self.e_vert, minlength=num_v).float()
+            ev_value = (1.0 / v_deg)[self.e_vert]
+        self.ve_value, self.ev_value = ve_value, ev_value
+        self.P_ve = torch.sparse_coo_tensor(torch.stack([e_id, self.e_vert]), ve_value,
+                                            (self.num_e, num_v)).coalesce()
+        self.P_ev = torch.sparse_coo_tensor(torch.stack([self.e_vert, e_id]), ev_value,
+                                            (num_v, self.num_e)).coalesce()
+
+    def v2e(self, X, aggr="mean"):
+        assert aggr == "mean"
+        return torch.sparse.mm(self.P_ve, X)
+
+    def e2v(self, X, aggr="mean"):
+        assert aggr == "mean"
+        return torch.sparse.mm(self.P_ev, X)
+
+    def v2v(self, X, aggr="mean"):
+        return self.e2v(self.v2e(X, aggr), aggr)
+
+    def v2v_rows(self, X, index, aggr="mean"):
+        # v2v(X)[index], through only the hyperedges that contain those vertices
+        assert aggr == "mean"
+        rows = self.P_ev.index_select(0, index).coalesce()
+        r, e = rows.indices()
+        needed, e = torch.unique(e, return_inverse=True)
+        rows = torch.sparse_coo_tensor(torch.stack([r, e]), rows.values(), (index.numel(), needed.numel()))
+        return torch.sparse.mm(rows, torch.sparse.mm(self.P_ve.index_select(0, needed), X))
+
+    def to(self, device):
+        self.P_ve = self.P_ve.to(device)
+        self.P_ev = self.P_ev.to(device)
+        return self
+
+    def state(self):
+        return dict(num_v=self.num_v, e_ptr=self.e_ptr, e_vert=self.e_vert.int(),
+                    ve_value=self.ve_value, ev_value=self.ev_value)
+
+
+def hypergraph_key(num_v, edge_index, k):
+    h = hashlib.sha256()
+    h.update(torch.as_tensor(edge_index).detach().cpu().long().contiguous().numpy().tobytes())
+    h.update(('%d/%d/v1' % (num_v, k)).encode())
+    return h.hexdigest()
+
+
+def load_hypergraph(num_v, edge_index, k=1, cache_dir=None):
+    # HyperOperator of the bipartite graph, read from cache_dir/hypergraph when present
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, 'hypergraph', hypergraph_key(num_v, edge_index, k) + '.pt')
+        if os.path.exists(path):
+            return HyperOperator(**torch.load(path))
+    hg = HyperOperator(num_v, *hyperedges_from_graph(num_v, edge_index, k))
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.%d.tmp' % os.getpid()
+        torch.save(hg.state(), tmp)
+        os.replace(tmp, path)
+    return hg
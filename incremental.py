@@ -0,0 +1,168 @@
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import torch
+from model import HGNNP
+from dataio import load_dataset
+from hypergraph import load_hypergraph
+from hyperEmbedding import HPARAMS, embedding_key, load_cached_embedding, save_cached_embedding, \
+    load_stage1_state, save_stage1_state
+from main import build_parser, getPreEmbedding, prepare_data, stage2_data, run_model, with_run_tag
+from telemetry import telemetry
+from fastcpu import PrecisionWarning
+from utils import edge_keys, contains_keys, update_split
+
+
+def node_map(old_gene, old_aux, new_gene):
+    # old vertex id -> new vertex id: genes keep theirs, aux ids shift by the added genes
+    return torch.cat([torch.arange(old_gene), torch.arange(old_aux) + new_gene])
+
+
+def affected_genes(old_edges, new_edges, num_v, num_gene, old_gene, hops):
+    # Genes whose row of the propagation D_v^-1 H D_e^-1 H^T can change: those
+    # within `hops` bipartite hops of an endpoint of an added or removed
+    # association, in the union of both graphs, plus every new gene. With
+    # k-hop hyperedges a change reaches 2k - 1 hops (one hop for k = 1).
+    old_keys, new_keys = edge_keys(old_edges, num_v), edge_keys(new_edges, num_v)
+    changed = torch.cat([old_keys[~contains_keys(new_keys, old_keys)], new_keys[~contains_keys(old_keys, new_keys)]])
+    mask = torch.zeros(num_v, dtype=torch.bool)
+    mask[changed // num_v] = True
+    mask[changed % num_v] = True
+    edges = torch.cat([old_edges, new_edges], dim=1)
+    row, col = torch.cat([edges[0], edges[1]]), torch.cat([edges[1], edges[0]])
+    for _ in range(hops):
+        reached = mask.clone()
+        reached[col[mask[row]]] = True
+        mask = reached
+    mask[old_gene:num_gene] = True
+    return mask[:num_gene].nonzero(as_tuple=False).view(-1)
+
+
+def incremental_key(key):
+    # cache key of warm-started Stage 1 results for the dataset of key. It is
+    # kept apart from key itself, which getPreEmbedding fills with a full
+    # Stage 1 training, and only later updates (--chain) read it.
+    return key + '.incremental'
+
+
+def update_stage1(old_dataset, dataset, args, prembsize=128):
+    # Stage 1 embeddings of the updated dataset from the previous Stage 1 state.
+    # The HGNNP weights are kept; only the affected genes are propagated again,
+    # through the rows of the new hypergraph they need, and every other gene
+    # keeps its previous embedding. The previous state is the full Stage 1
+    # entry of the old dataset, or with args.chain the warm-started one of the
+    # update that produced it. The result goes under incremental_key.
+    hparams = dict(HPARAMS, mode=args.stage1_mode)
+    assert hparams['mode'] == 'full' or hparams['hops'] == 1, 'incremental updates need embeddings of embed(X, hg)'
+    old_gene, old_aux = len(old_dataset['gene']['node_id']), len(old_dataset['aux']['node_id'])
+    num_gene, num_aux = len(dataset['gene']['node_id']), len(dataset['aux']['node_id'])
+    assert num_gene >= old_gene and num_aux >= old_aux, 'genes and aux nodes may only be appended'
+    old_bipartite = old_dataset['associated_to']['edge_index']
+    bipartite = dataset['associated_to']['edge_index']
+
+    old_key = embedding_key(old_bipartite, old_gene, old_aux, prembsize, args.seed, hparams)
+    if args.chain:
+        old_key = incremental_key(old_key)
+        state = load_stage1_state(args.cache_dir, old_key)
+        if state is None:
+            raise ValueError(f'no incremental Stage 1 entry for {args.old_data} in {args.cache_dir} to chain from')
+    else:
+        state = load_stage1_state(args.cache_dir, old_key)
+        if state is None:
+            # cached before the state was kept
+            getPreEmbedding(old_dataset, prembsize, args.seed, args.cache_dir, dict(mode=args.stage1_mode), refresh=True)
+            state = load_stage1_state(args.cache_dir, old_key)
+    old_embeddings = load_cached_embedding(args.cache_dir, old_key)
+
+    num_v = num_gene + num_aux
+    mapping = node_map(old_gene, old_aux, num_gene)
+    X = torch.rand(num_v, prembsize)
+    X[mapping] = state['X']
+    net = HGNNP(prembsize, prembsize, 2)
+    net.load_state_dict(state['net'])
+    net.eval()
+    hg = load_hypergraph(num_v, bipartite, hparams['k'], args.cache_dir)
+
+    genes = affected_genes(mapping[old_bipartite], bipartite, num_v, num_gene, old_gene, 2 * hparams['k'] - 1)
+    embeddings = torch.empty(num_gene, old_embeddings.size(1))
+    embeddings[:old_gene] = old_embeddings
+    with torch.no_grad():
+        embeddings[genes] = net.embed_rows(X, hg, genes)
+
+    key = incremental_key(embedding_key(bipartite, num_gene, num_aux, prembsize, args.seed, hparams))
+    save_cached_embedding(args.cache_dir, key, embeddings)
+    save_stage1_state(args.cache_dir, key, X, net, num_gene, num_aux, parent=old_key)
+    return embeddings, genes
+
+
+def summary(results):
+    train_auc, valid_auc, test_auc, f1 = results['AUC']
+    return dict(valid_auc=valid_auc, test_auc=test_auc, test_aupr=results['AUPR'][2], f1=f1)
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.add_argument('--old_data', type=str, required=True, help='dataset the checkpoint was trained on')
+    parser.add_argument('--checkpoint', type=str, required=True,
+                        help='run checkpoint prefix on --old_data, e.g. checkpoints/hd_<run_tag>_run00')
+    parser.add_argument('--chain', action='store_true',
+                        help='--checkpoint is from an earlier incremental update; warm-start from its Stage 1 entry')
+    parser.add_argument('--finetune_epochs', type=int, default=20)
+    parser.add_argument('--compare_full', action='store_true', help='also retrain both stages from scratch on the updated split')
+    parser.add_argument('--report', type=str, default='incremental.json')
+    warnings.simplefilter('ignore')
+    warnings.simplefilter('always', PrecisionWarning)
+    args = parser.parse_args()
+    assert args.cache_dir, 'incremental updates read the Stage 1 state from --cache_dir'
+    args = with_run_tag(args)
+    telemetry.configure(args.telemetry, sample_memory=args.sample_memory)
+    device = torch.device('cpu')
+
+    # the checkpoint's own split, rebuilt from the same seed
+    _, _, old_split = prepare_data(args.old_data, args)
+    old_dataset, dataset = load_dataset(args.old_data), load_dataset(args.data_name)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    generator = torch.Generator().manual_seed(args.seed)
+    split_edge = update_split(old_split, dataset['interacts']['edge_index'], len(dataset['gene']['node_id']),
+                              generator=generator)
+    report = dict(old_data=args.old_data, data_name=args.data_name, checkpoint=args.checkpoint,
+                  splits={split: {key: int(split_edge[split][key].size(0)) for key in split_edge[split]}
+                          for split in split_edge})
+
+    start = time.time()
+    with telemetry.timer('incremental.stage1'):
+        embeddings, genes = update_stage1(old_dataset, dataset, args)
+    stage1_seconds = time.time() - start
+    data, train_adj, split_edge = stage2_data(args.data_name, dataset, embeddings, device, split_edge)
+    ft_args = argparse.Namespace(**dict(vars(args), epochs=args.finetune_epochs))
+    start = time.time()
+    with telemetry.timer('incremental.stage2'):
+        results = run_model(0, args.data_name, data, train_adj, split_edge, ft_args,
+                            f'{args.data_name}_incremental', init=args.checkpoint)
+    report['incremental'] = dict(stage1_seconds=stage1_seconds, stage2_seconds=time.time() - start,
+                                 epochs=args.finetune_epochs, recomputed_genes=int(genes.numel()),
+                                 genes=int(data.num_nodes), **summary(results))
+
+    if args.compare_full:
+        start = time.time()
+        with telemetry.timer('full.stage1'):
+            embeddings = getPreEmbedding(dataset, 128, args.seed, None, dict(mode=args.stage1_mode))
+        stage1_seconds = time.time() - start
+        data, train_adj, split_edge = stage2_data(args.data_name, dataset, embeddings, device, split_edge)
+        start = time.time()
+        with telemetry.timer('full.stage2'):
+            results = run_model(0, args.data_name, data, train_adj, split_edge, args, f'{args.data_name}_full')
+        report['full'] = dict(stage1_seconds=stage1_seconds, stage2_seconds=time.time() - start,
+                              epochs=args.epochs, **summary(results))
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=1)
+    telemetry.flush()
+    for mode in ['incremental', 'full']:
+        if mode in report:
+            r = report[mode]
+            print(f"{mode:12s} stage1 {r['stage1_seconds']:7.2f}s  stage2 {r['stage2_seconds']:7.2f}s  "
+                  f"test AUC {r['test_auc']:.4f}  AUPR {r['test_aupr']:.4f}")
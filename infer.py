@@ -0,0 +1,77 @@
+import warnings
+import torch
+import pandas as pd
+from model import GCN_mgae, LPD, FusedLPD
+from main import build_parser, prepare_data, encode
+from telemetry import telemetry
+from utils import edge_keys, topk_partners
+
+
+def load_trained(args, data, prefix):
+    # model and predictor of one run_model checkpoint pair, prefix_model.pth / prefix_pred.pth
+    decoder = FusedLPD if args.fused_decoder else LPD
+    predictor = decoder(args.hidden_channels, args.decode_channels, 1, args.num_layers, args.decode_layers, args.dropout)
+    model = GCN_mgae(data.num_features, args.hidden_channels, args.hidden_channels, args.num_layers, args.dropout,
+                     decoder_mask=args.decoder_mask, num_nodes=data.num_nodes)
+    model.load_state_dict(torch.load(prefix + '_model.pth', map_location='cpu'))
+    predictor.load_state_dict(torch.load(prefix + '_pred.pth', map_location='cpu'))
+    model.eval()
+    predictor.eval()
+    return model.to(data.x.device), predictor.to(data.x.device)
+
+
+@torch.no_grad()
+def embed(model, data, train_adj, args):
+    # the layer outputs LPD consumes, on the train graph the run was fit on
+    adj = train_adj.adj()[0].to(data.x.device)
+    return encode(model, data, adj, args)
+
+
+def known_edges(split_edge, num_nodes):
+    edges = torch.cat([split_edge[split]['edge'] for split in ['train', 'valid', 'test']], dim=0)
+    return edge_keys(edges.t(), num_nodes)
+
+
+def parse_queries(spec, num_nodes):
+    # comma separated gene ids, @file with one id per line, or empty for every gene
+    if not spec:
+        return torch.arange(num_nodes)
+    if spec.startswith('@'):
+        with open(spec[1:]) as f:
+            spec = ','.join(line.strip() for line in f if line.strip())
+    return torch.tensor([int(q) for q in spec.split(',')])
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.add_argument('--checkpoint', type=str, required=True,
+                        help='run checkpoint prefix, e.g. checkpoints/hd_<run_tag>_run00')
+    parser.add_argument('--queries', type=str, default='', help='gene ids, @file, or empty for all genes')
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--keep_known', action='store_true', help='also rank pairs that are already edges')
+    parser.add_argument('--symmetric', action='store_true', help='average the scores of both pair orientations')
+    parser.add_argument('--out', type=str, default='topk.csv')
+    warnings.simplefilter('ignore')
+    args = parser.parse_args()
+    telemetry.configure(args.telemetry, sample_memory=args.sample_memory)
+
+    # same seed and data_name as training reproduce its split and train graph
+    data, train_adj, split_edge = prepare_data(args.data_name, args)
+    model, predictor = load_trained(args, data, args.checkpoint)
+    with telemetry.timer('encode'):
+        h = embed(model, data, train_adj, args)
+
+    query = parse_queries(args.queries, data.num_nodes)
+    known = None if args.keep_known else known_edges(split_edge, data.num_nodes)
+    with telemetry.timer('topk', queries=query.numel(), k=args.k):
+        scores, partners = topk_partners(predictor, h, query, args.k, known, symmetric=args.symmetric,
+                                         mem_budget=args.eval_mem_mb * 2**20)
+
+    rank = torch.arange(1, scores.size(1) + 1).expand_as(scores)
+    table = pd.DataFrame(dict(query=query.view(-1, 1).expand_as(scores).reshape(-1).numpy(),
+                              rank=rank.reshape(-1).numpy(), partner=partners.reshape(-1).cpu().numpy(),
+                              score=scores.reshape(-1).cpu().numpy()))
+    table = table[table.score > float('-inf')]
+    table.to_csv(args.out, index=False)
+    telemetry.flush()
+    print(f'{len(table)} pairs for {query.numel()} queries -> {args.out}')
@@ -1,17 +1,22 @@
 import os
+import math
 import os.path as osp
+import json
 import argparse
 import warnings
 import torch
 import numpy as np
 import pandas as pd
 import time
-from torch.utils.data import DataLoader
+import itertools
 from sklearn.metrics import roc_auc_score, average_precision_score, f1_score
-from torch_sparse import SparseTensor
-from model import GCN_mgae, LPD 
-from hyperEmbedding import HyperEmbedding
-from utils import edge_split_direct, random_edge_mask, Logger, evaluate_auc
+from model import GCN_mgae, LPD, FusedLPD 
+from dataio import load_dataset
+from hyperEmbedding import HyperEmbedding, HPARAMS, embedding_key, load_cached_embedding, save_cached_embedding, save_stage1_state
+from metrics import binary_metrics
+from telemetry import telemetry, parse_steps
+from fastcpu import configure_threads, to_backend, pick_backend, compile_module, decoder_autocast, eager_reference, PrecisionWarning
+from utils import edge_split_direct, random_edge_mask, TrainAdjacency, MaskPrefetcher, negative_key_index, sample_neighborhood, CheckpointWriter, snapshot, share_memory, Logger, evaluate_auc, score_edges
 from torch_geometric.data import Data
 from torch_geometric.utils import to_undirected, add_self_loops, negative_sampling
 
@@ -20,136 +25,194 @@ from torch_geometric.utils import to_undirected, add_self_loops, negative_sampli
 
     
 
-def train(model, predictor, data, split_edge, optimizer, args):
+def epoch_negatives(split_edge, epoch_graph):
+    # [2, M] negatives of this epoch: the prefetcher's fresh draw or the fixed train set
+    if len(epoch_graph) > 3 and epoch_graph[3] is not None:
+        return epoch_graph[3]
+    return split_edge['train']['edge_neg'].t()
+
+
+def train(model, predictor, data, split_edge, optimizer, args, train_adj=None, epoch_graph=None):
     model.train()
     predictor.train()
 
     new_edge_index=[]
 
-    adj, edge_index, edge_index_mask = random_edge_mask(args, split_edge, data.x.device, data.num_nodes)
-    data.edge_index = adj.to(data.x.device)
+    if epoch_graph is None:
+        epoch_graph = random_edge_mask(args, split_edge, data.x.device, data.num_nodes, train_adj)
+    adj, edge_index, edge_index_mask = epoch_graph[:3]
+    adj = adj.to(data.x.device)
+    if args.fast_cpu:
+        adj = to_backend(adj, args.spmm_backend)
+    edge_index_mask = edge_index_mask.to(data.x.device)
+    data.edge_index = adj
     pos_train_edge = edge_index_mask
     new_edge_index = edge_index.cpu()   
     
     
     optimizer.zero_grad()
     
-    h = model(data.x, adj)
-    edge = pos_train_edge.T 
-    pos_out = predictor(h, edge)
-    pos_loss = -torch.log(pos_out + 1e-15).mean()
+    with telemetry.timer('forward'):
+        h = model(data.x, adj)
+        edge = pos_train_edge
+        with decoder_autocast(args.fast_cpu):
+            pos_out = predictor(h, edge)
+        pos_loss = -torch.log(pos_out.float() + 1e-15).mean()
 
     # pos_edge = split_edge['train']['edge'].t()
     #new_edge_index, _ = add_self_loops(edge_index.cpu())
     
     
-    edge = split_edge['train']['edge_neg']
-    edge = edge.to(data.x.device)
-    edge = edge.T  
+        edge = epoch_negatives(split_edge, epoch_graph)
+        edge = edge.to(data.x.device)
     
 
-    neg_out = predictor(h, edge)
+        with decoder_autocast(args.fast_cpu):
+            neg_out = predictor(h, edge)
     #print("neg_out:", neg_out)
-    neg_loss = -torch.log(1 - neg_out + 1e-15).mean()
+        neg_loss = -torch.log(1 - neg_out.float() + 1e-15).mean()
 
-    loss = pos_loss + neg_loss
-    loss.backward()
+        loss = pos_loss + neg_loss
+    with telemetry.timer('backward'):
+        loss.backward()
     
-    torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-    torch.nn.utils.clip_grad_norm_(predictor.parameters(), 1.0)
+    with telemetry.timer('optimizer'):
+        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+        torch.nn.utils.clip_grad_norm_(predictor.parameters(), 1.0)
 
-    optimizer.step()
+        optimizer.step()
+    telemetry.count('train.pos_edges', pos_train_edge.size(1))
 
     return loss.item()
 
 
+def train_minibatch(model, predictor, data, split_edge, optimizer, args, train_adj=None, epoch_graph=None):
+    # Masked edges are processed in batches of args.train_batch_size with a
+    # proportional share of the negatives. Each batch runs the encoder only on
+    # the sampled multi-hop neighbourhood of its endpoints.
+    model.train()
+    predictor.train()
+
+    if epoch_graph is None:
+        epoch_graph = random_edge_mask(args, split_edge, data.x.device, data.num_nodes, train_adj)
+    adj, edge_index, pos_train_edge = epoch_graph[:3]
+    adj = adj.to(data.x.device)
+    pos_train_edge = pos_train_edge.to(data.x.device)
+    neg_train_edge = epoch_negatives(split_edge, epoch_graph).to(data.x.device)
+    fanouts = [int(f) for f in args.fanouts.split(',')]
+    fanouts = (fanouts + fanouts[-1:] * args.num_layers)[:args.num_layers]
+
+    pos_perm = torch.randperm(pos_train_edge.size(1))
+    neg_perm = torch.randperm(neg_train_edge.size(1))
+    num_batches = max(1, math.ceil(pos_perm.numel() / args.train_batch_size))
+    neg_size = math.ceil(neg_perm.numel() / num_batches)
+
+    total_loss = 0
+    for i, pos_idx in enumerate(pos_perm.split(args.train_batch_size)):
+        pos = pos_train_edge[:, pos_idx]
+        neg = neg_train_edge[:, neg_perm[i * neg_size:(i + 1) * neg_size]]
+        with telemetry.timer('sample'):
+            nodes, inv = torch.unique(torch.cat([pos, neg], dim=1), return_inverse=True)
+            n_id, adjs = sample_neighborhood(adj, nodes, fanouts)
+
+        optimizer.zero_grad()
+        with telemetry.timer('forward'):
+            h = model.forward_sampled(data.x[n_id], adjs, nodes.numel())
+            with decoder_autocast(args.fast_cpu):
+                pos_out = predictor(h, inv[:, :pos.size(1)])
+                neg_out = predictor(h, inv[:, pos.size(1):])
+            pos_loss = -torch.log(pos_out.float() + 1e-15).mean()
+            neg_loss = -torch.log(1 - neg_out.float() + 1e-15).mean()
+            loss = pos_loss + neg_loss
+        with telemetry.timer('backward'):
+            loss.backward()
+
+        with telemetry.timer('optimizer'):
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            torch.nn.utils.clip_grad_norm_(predictor.parameters(), 1.0)
+            optimizer.step()
+        total_loss += loss.item()
+        telemetry.count('train.batches')
+        telemetry.count('train.sampled_nodes', n_id.numel())
+
+    return total_loss / num_batches
+
+
+def encode(model, data, adj, args):
+    if args.minibatch:
+        return model.inference(data.x, adj, args.infer_batch_size)
+    if args.fast_cpu:
+        adj = to_backend(adj, args.spmm_backend)
+    return model(data.x, adj)
+
+
 @torch.no_grad()
-def test(model, predictor, data, adj, split_edge, batch_size):
+def test(model, predictor, data, adj, split_edge, args):
     model.eval()
-    h = model(data.x, adj)
+    predictor.eval()
+    h = encode(model, data, adj, args)
     #print("h: ",h)
     #print("h[0].shape: ",len(h))
     #h = h[0]
-    pos_train_edge = split_edge['train']['edge'].to(data.x.device)
-    neg_train_edge = split_edge['train']['edge_neg'].to(data.x.device)
-    pos_valid_edge = split_edge['valid']['edge'].to(data.x.device)
-    neg_valid_edge = split_edge['valid']['edge_neg'].to(data.x.device)
-    pos_test_edge = split_edge['test']['edge'].to(data.x.device)
-    neg_test_edge = split_edge['test']['edge_neg'].to(data.x.device)
-
-    pos_train_preds = []
-    for perm in DataLoader(range(pos_train_edge.size(0)), batch_size):
-        edge = pos_train_edge[perm].t()
-        #print("edge_test: ",edge)
-        pos_train_preds += [predictor(h, edge).squeeze().cpu()]
-    pos_train_pred = torch.cat(pos_train_preds, dim=0)
-
-    pos_valid_preds = []
-    for perm in DataLoader(range(pos_valid_edge.size(0)), batch_size):
-        edge = pos_valid_edge[perm].t()
-        #print("edge_test: ",edge)
-        pos_valid_preds += [predictor(h, edge).squeeze().cpu()]
-    pos_valid_pred = torch.cat(pos_valid_preds, dim=0)
-
-    neg_train_preds = []
-    for perm in DataLoader(range(neg_train_edge.size(0)), batch_size):
-        edge = neg_train_edge[perm].t()
-        #print("edge_test: ",edge)
-        neg_train_preds += [predictor(h, edge).squeeze().cpu()]
-    neg_train_pred = torch.cat(neg_train_preds, dim=0)
-
-    neg_valid_preds = []
-    for perm in DataLoader(range(neg_valid_edge.size(0)), batch_size):
-        edge = neg_valid_edge[perm].t()
-        neg_valid_preds += [predictor(h, edge).squeeze().cpu()]
-    neg_valid_pred = torch.cat(neg_valid_preds, dim=0)
-
-    pos_test_preds = []
-    for perm in DataLoader(range(pos_test_edge.size(0)), batch_size):
-        #print("type(pos_test_edge): ",type(pos_test_edge))
-        edge = pos_test_edge[perm].t()
-        pos_test_preds += [predictor(h, edge).squeeze().cpu()]
-    pos_test_pred = torch.cat(pos_test_preds, dim=0)
-
-    neg_test_preds = []
-    for perm in DataLoader(range(neg_test_edge.size(0)), batch_size):
-        edge = neg_test_edge[perm].t()
-        neg_test_preds += [predictor(h, edge).squeeze().cpu()]
-    neg_test_pred = torch.cat(neg_test_preds, dim=0)
-
-    
-    train_pred = torch.cat([pos_train_pred, neg_train_pred], dim=0)
-    train_true = torch.cat([torch.ones_like(pos_train_pred), torch.zeros_like(neg_train_pred)], dim=0)
-
-    val_pred = torch.cat([pos_valid_pred, neg_valid_pred], dim=0)
-    val_true = torch.cat([torch.ones_like(pos_valid_pred), torch.zeros_like(neg_valid_pred)], dim=0)
-    
-    
-
-    test_pred = torch.cat([pos_test_pred, neg_test_pred], dim=0)
-    test_true = torch.cat([torch.ones_like(pos_test_pred), torch.zeros_like(neg_test_pred)], dim=0)
-    
-    results = evaluate_auc(train_pred, train_true, val_pred, val_true, test_pred, test_true)
+    edges = dict()
+    for split in ['train', 'valid', 'test']:
+        edges[split + '_pos'] = split_edge[split]['edge']
+        edges[split + '_neg'] = split_edge[split]['edge_neg']
+    with decoder_autocast(args.fast_cpu):
+        preds = score_edges(predictor, h, edges, args.eval_mem_mb * 2**20, args.batch_size)
+
+    y = dict()
+    for split in ['train', 'valid', 'test']:
+        pos_pred, neg_pred = preds[split + '_pos'], preds[split + '_neg']
+        y[split] = (torch.cat([pos_pred, neg_pred], dim=0),
+                    torch.cat([torch.ones_like(pos_pred), torch.zeros_like(neg_pred)], dim=0))
+    
+    results = evaluate_auc(*y['train'], *y['valid'], *y['test'])
     return results
     
 
-def getPreEmbedding(data,prembsize):
+@torch.no_grad()
+def validate(model, predictor, data, adj, split_edge, args, subset=None):
+    # validation AUC only, optionally on a fixed subsample of the split
+    model.eval()
+    predictor.eval()
+    h = encode(model, data, adj, args)
+    edges = {'pos': split_edge['valid']['edge'], 'neg': split_edge['valid']['edge_neg']}
+    if subset is not None:
+        edges = {key: edges[key][subset[key]] for key in edges}
+    with decoder_autocast(args.fast_cpu):
+        preds = score_edges(predictor, h, edges, args.eval_mem_mb * 2**20, args.batch_size)
+    pred = torch.cat([preds['pos'], preds['neg']], dim=0)
+    true = torch.cat([torch.ones_like(preds['pos']), torch.zeros_like(preds['neg'])], dim=0)
+    return binary_metrics(pred, true)['auc']
+
+
+def getPreEmbedding(data,prembsize,seed=None,cache_dir=None,hparams=None,refresh=False):
+    # refresh retrains even on a cache hit, e.g. to store the Stage 1 state of an old entry
     no_gene = len(data['gene']['node_id'])
     no_aux = len(data['aux']['node_id'])
+    Bipartite = data['associated_to']['edge_index']
+    hparams = dict(HPARAMS, **(hparams or {}))
+    if cache_dir:
+        key = embedding_key(Bipartite, no_gene, no_aux, prembsize, seed, hparams)
+        embeddings = None if refresh else load_cached_embedding(cache_dir, key)
+        if embeddings is not None:
+            return embeddings
     X = torch.rand(no_gene+no_aux,prembsize) #gene and aux node embeddings are initialized with random values, to be learnt
     lbl_gene = torch.zeros(no_gene) #gene nodes are assigned label 0
     lbl_aux = torch.ones(no_aux) #auxiliary nodes are assigned label 1
     lbl = torch.cat((lbl_gene,lbl_aux))
     lbl = lbl.type(torch.LongTensor)
-    Bipartite = data['associated_to']['edge_index']
-    HyperEmbedding(X,lbl,no_gene,Bipartite)
-    embeddings = torch.load('prembed.pt')
+    embeddings, net = HyperEmbedding(X,lbl,no_gene,Bipartite,hparams,cache_dir,return_net=True)
+    if cache_dir:
+        save_cached_embedding(cache_dir, key, embeddings)
+        save_stage1_state(cache_dir, key, X, net, no_gene, no_aux)
     return embeddings     
 
 
 
 
-def HyperSSL(data_name,args):
+def prepare_data(data_name,args):
     
 
     
@@ -165,119 +228,204 @@ def HyperSSL(data_name,args):
     device = torch.device('cpu')
 
 
-    dataset = torch.load(f"datasets/{data_name}.pt") 
+    with telemetry.timer('load', dataset=data_name):
+        dataset = load_dataset(data_name) 
     #print(dataset)
     
     #Stage1. HyperEmbedding Learning
-    embeddings = getPreEmbedding(dataset,prembsize)
+    with telemetry.timer('stage1', dataset=data_name):
+        embeddings = getPreEmbedding(dataset,prembsize,args.seed,args.cache_dir,dict(mode=args.stage1_mode))
+    # Stage 1 reseeds the global RNGs; start Stage 2 from the same state whether or not it was cached
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
     #print("embeddings: ",embeddings)
     
     #Stage2. Masked AutoEncoder Link Prediction
+    return stage2_data(data_name, dataset, embeddings, device)
+
+
+def stage2_data(data_name, dataset, embeddings, device, split_edge=None):
+    # the gene graph with its split and train adjacency; a given split_edge is used as is
     geneCoexpression = Data()
     geneCoexpression.num_nodes = len(dataset['gene']['node_id'])
     geneCoexpression.edge_index = dataset['interacts']['edge_index']
     geneCoexpression.x = embeddings
     geneCoexpression.num_features = 128
-    all_edges = geneCoexpression.edge_index
-    
-    
-    dataset.num_nodes = len(dataset['gene']['node_id'])
-    dataset.edge_index = dataset['interacts']['edge_index']
-    all_edges = dataset['edge_index']
-    adjt = np.zeros((geneCoexpression.num_nodes,geneCoexpression.num_nodes))
-    
-    for i in range(all_edges.shape[1]):
-        adjt[int(all_edges[0][i])][int(all_edges[1][i])] = 1
-        adjt[int(all_edges[1][i])][int(all_edges[0][i])] = 1
-    #print("adjt: ",adjt)
-    
-    all_neg_edges_x = []
-    all_neg_edges_y = []
-    
-    for i in range(geneCoexpression.num_nodes):
-        for j in range(i+1,geneCoexpression.num_nodes):
-            if adjt[i][j] == 1:
-                continue
-            else:
-                all_neg_edges_x.append(i)
-                all_neg_edges_y.append(j)
-    all_neg_edges = [all_neg_edges_x,all_neg_edges_y]
-    #print("all_neg_edges.shape",len(all_neg_edges[0]))
-    all_neg_edges = torch.LongTensor(all_neg_edges)
-    #print("all_neg_edges.shape",all_neg_edges.shape)
-    
     
     geneCoexpression.edge_attr = None
     
-    split_edge = edge_split_direct(geneCoexpression)   
+    if split_edge is None:
+        with telemetry.timer('split', dataset=data_name):
+            split_edge = edge_split_direct(geneCoexpression)   
     data = geneCoexpression
     
     
 
     data.edge_index = to_undirected(split_edge['train']['edge'].t())
-    edge_index, _ = add_self_loops(data.edge_index)             
-    adj = SparseTensor.from_edge_index(edge_index).t()
+    with telemetry.timer('adjacency', dataset=data_name):
+        train_adj = TrainAdjacency(split_edge['train']['edge'], data.num_nodes)
     data = data.to(device)
-    
+    return data, train_adj, split_edge
+
+
+_run_tags = itertools.count()
+
+
+def with_run_tag(args):
+    # args with a checkpoint tag unique to this call: start time, pid and a per-process counter
+    if args.run_tag:
+        return args
+    tag = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}-{next(_run_tags)}'
+    return argparse.Namespace(**dict(vars(args), run_tag=tag))
+
+
+def run_model(run, data_name, data, train_adj, split_edge, args, name=None, init=None):
+    # one independent run; seeded by run so serial and pooled runs agree. With
+    # init (a checkpoint prefix) training starts from those weights.
+    args = with_run_tag(args)
+    np.random.seed(args.seed + run)
+    torch.manual_seed(args.seed + run)
+    device = data.x.device
+    adj, edge_index = train_adj.adj()
     adj = adj.to(device)
 
-    save_path_model = 'gcn'+ '_model.pth'
-    save_path_predictor = 'gcn'+'_pred.pth'
-    
-    out_name = ''
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    name = name or data_name
+    save_path_model = osp.join(args.checkpoint_dir, f'{name}_{args.run_tag}_run{run:02d}_model.pth')
+    save_path_predictor = osp.join(args.checkpoint_dir, f'{name}_{args.run_tag}_run{run:02d}_pred.pth')
 
-    metric = 'AUC'
-    predictor = LPD(args.hidden_channels, args.decode_channels, 1, args.num_layers,args.decode_layers, args.dropout).to(device)
+    decoder = FusedLPD if args.fused_decoder else LPD
+    predictor = decoder(args.hidden_channels, args.decode_channels, 1, args.num_layers,args.decode_layers, args.dropout).to(device)
                               
     model = GCN_mgae(data.num_features, args.hidden_channels,args.hidden_channels, args.num_layers,args.dropout, decoder_mask=args.decoder_mask, num_nodes=data.num_nodes).to(device)
     
-        
+    model.reset_parameters()
+    predictor.reset_parameters()
+    if init:
+        model.load_state_dict(torch.load(init + '_model.pth', map_location=device))
+        predictor.load_state_dict(torch.load(init + '_pred.pth', map_location=device))
+    if args.fast_cpu:
+        # the layer-wise mini-batch inference slices the adjacency, which needs torch_sparse
+        backend = 'torch_sparse' if args.minibatch else args.spmm_backend
+        if backend == 'auto':
+            backend = pick_backend(adj, data.x.new_empty(data.num_nodes, args.hidden_channels).normal_())
+        args = argparse.Namespace(**dict(vars(args), spmm_backend=backend))
+        compile_module(model)
+        compile_module(predictor)
+    optimizer = torch.optim.Adam(
+        list(model.parameters()) + list(predictor.parameters()),
+        lr=args.lr)
+
+    # model selection looks at validation AUC only, on a fixed subsample if requested
+    subset = None
+    if args.val_subsample:
+        generator = torch.Generator().manual_seed(args.seed + run)
+        subset = {key: torch.randperm(split_edge['valid'][edge].size(0), generator=generator)[:args.val_subsample]
+                  for key, edge in [('pos', 'edge'), ('neg', 'edge_neg')]}
+
+    best_valid = 0.0
+    best_epoch = 0
+    best_state = None
+    writer = CheckpointWriter()
+    neg_keys = negative_key_index(split_edge, data.num_nodes) if args.neg_ratio > 0 else None
+    masks = MaskPrefetcher(train_adj, args.mask_ratio, args.seed * 1000 + run, args.epochs, args.prefetch,
+                           neg_keys, args.neg_ratio)
+    for epoch in range(1, 1 + args.epochs):
+        step = train_minibatch if args.minibatch else train
+        with telemetry.profile(f'{name}_run{run:02d}', epoch):
+            with telemetry.timer('mask', run=run, epoch=epoch):
+                epoch_graph = masks.get(epoch)
+            with telemetry.timer('train', run=run, epoch=epoch):
+                loss = step(model, predictor, data, split_edge, optimizer, args, train_adj, epoch_graph)
+        telemetry.count('epochs')
+
+        if epoch % args.eval_steps != 0 and epoch != args.epochs:
+            continue
+        with telemetry.timer('validate', run=run, epoch=epoch):
+            valid_hits = validate(model, predictor, data, adj, split_edge, args, subset)
+        if valid_hits > best_valid:
+            best_valid = valid_hits
+            best_epoch = epoch
+            best_state = (snapshot(model), snapshot(predictor))
+            writer.submit(save_path_model, best_state[0])
+            writer.submit(save_path_predictor, best_state[1])
+        elif epoch - best_epoch >= args.patience:
+            #print('Early stopping!')
+            break
+    masks.close()
+    
+    if best_state is not None:
+        model.load_state_dict(best_state[0])
+        predictor.load_state_dict(best_state[1])
+    writer.close()
+    with telemetry.timer('test', run=run):
+        results = test(model, predictor, data, adj, split_edge, args)
+    if args.fast_cpu and args.fast_cpu_tol >= 0:
+        # the same weights through the eager fp32 path must agree on AUC
+        eager_args = argparse.Namespace(**dict(vars(args), fast_cpu=False, spmm_backend='torch_sparse'))
+        with eager_reference():
+            reference = test(model, predictor, data, adj, split_edge, eager_args)
+        gap = max(abs(a - b) for a, b in zip(results['AUC'][:3], reference['AUC'][:3]))
+        passed = gap <= args.fast_cpu_tol
+        telemetry.event('fast_cpu_check', job=name, run=run, gap=gap, passed=passed, auc=results['AUC'],
+                        reference=reference['AUC'])
+        # the fast path's results stay primary; the eager ones are reported next to them
+        results.update({f'{key}_eager': result for key, result in reference.items()})
+        if not passed:
+            warnings.warn(f'{name} run {run}: --fast_cpu AUC {results["AUC"][:3]} differs from fp32 eager '
+                          f'{reference["AUC"][:3]} by {gap:.4f}', PrecisionWarning)
+    telemetry.event('result', dataset=data_name, job=name, run=run, best_epoch=best_epoch, **results)
+    return results
+
+
+_worker_state = {}
+
+
+def _init_worker(datasets, num_threads, telemetry_config):
+    torch.set_num_threads(num_threads)
+    telemetry.configure(**telemetry_config)
+    _worker_state.update(datasets)
+
+
+def _run_worker(job):
+    data_name, name, run, args = job
+    data, train_adj, split_edge = _worker_state[data_name]
+    results = run_model(run, data_name, data, train_adj, split_edge, args, name)
+    telemetry.flush()
+    return job, results
+
+
+def run_jobs(jobs, datasets, args):
+    # Runs (data_name, name, run, args) jobs in order, serially or on a pool of
+    # --parallel_runs spawned workers. The prepared datasets are moved to shared
+    # memory once and mapped by every worker instead of copied.
+    if args.parallel_runs <= 1:
+        for job in jobs:
+            data_name, name, run, job_args = job
+            data, train_adj, split_edge = datasets[data_name]
+            yield job, run_model(run, data_name, data, train_adj, split_edge, job_args, name)
+        return
+    share_memory(datasets)
+    num_threads = args.threads_per_run or max(1, (os.cpu_count() or 1) // args.parallel_runs)
+    ctx = torch.multiprocessing.get_context('spawn')
+    with ctx.Pool(args.parallel_runs, initializer=_init_worker, initargs=(datasets, num_threads, telemetry.config())) as pool:
+        for job, results in pool.imap_unordered(_run_worker, jobs):
+            yield job, results
+
+
+def HyperSSL(data_name,args):
+    args = with_run_tag(args)
+    datasets = {data_name: prepare_data(data_name, args)}
     
     loggers = {
         'AUC': Logger(args.runs, args),
         'AUPR': Logger(args.runs, args)
     }
+    if args.fast_cpu and args.fast_cpu_tol >= 0:
+        loggers.update({f'{key}_eager': Logger(args.runs, args) for key in list(loggers)})
     
-
-    for run in range(args.runs):
-        model.reset_parameters()
-        predictor.reset_parameters()
-        optimizer = torch.optim.Adam(
-            list(model.parameters()) + list(predictor.parameters()),
-            lr=args.lr)
-
-        best_valid = 0.0
-        best_epoch = 0
-        cnt_wait = 0
-        for epoch in range(1, 1 + args.epochs):
-            t1 = time.time()
-            loss = train(model, predictor, data, split_edge, optimizer,args)
-            t2 = time.time()
-
-            results = test(model, predictor, data, adj, split_edge, args.batch_size)
-                           
-            
-
-            valid_hits = results[metric][1]
-            if valid_hits > best_valid:
-                best_valid = valid_hits
-                best_epoch = epoch
-                torch.save(model.state_dict(), save_path_model)
-                torch.save(predictor.state_dict(), save_path_predictor)
-                cnt_wait = 0
-            else:
-                cnt_wait += 1
-
-            
-            if cnt_wait == args.patience:
-                #print('Early stopping!')
-                break
-        
-        model.load_state_dict(torch.load(save_path_model))
-        predictor.load_state_dict(torch.load(save_path_predictor))
-        results = test(model, predictor, data, adj, split_edge,args.batch_size)
-        
-                       
+    jobs = [(data_name, data_name, run, args) for run in range(args.runs)]
+    for (_, _, run, _), results in run_jobs(jobs, datasets, args):
         for key, result in results.items():
             loggers[key].add_result(run, result)
 
@@ -286,6 +434,54 @@ def HyperSSL(data_name,args):
         
         loggers[key].print_statistics(key)
         #break
+    telemetry.flush()
+
+
+# fixed for a batch: the prepared data (Stage 1 and split) and the worker pool
+BATCH_FIXED_ARGS = {'data_name', 'datasets', 'seed', 'stage1_mode', 'cache_dir', 'configs', 'results_file',
+                    'parallel_runs', 'threads_per_run'}
+
+
+def HyperSSLBatch(data_names, configs, args):
+    # Every (dataset, config, run) job goes to one worker pool. Configs override
+    # Stage 2 arguments only; each dataset is prepared once. Jobs of the largest
+    # datasets are queued first to shorten the makespan.
+    args = with_run_tag(args)
+    for overrides in configs:
+        fixed = sorted(set(overrides) & BATCH_FIXED_ARGS)
+        unknown = sorted(set(overrides) - set(vars(args)))
+        if fixed:
+            raise ValueError(f'config {overrides} overrides {fixed}, which are shared by the whole batch')
+        if unknown:
+            raise ValueError(f'config {overrides} has unknown arguments {unknown}')
+    datasets = {data_name: prepare_data(data_name, args) for data_name in data_names}
+
+    def cost(data_name):
+        data, train_adj, split_edge = datasets[data_name]
+        return data.num_nodes + sum(split_edge[s][k].size(0) for s in split_edge for k in split_edge[s])
+
+    jobs = []
+    for data_name in sorted(data_names, key=cost, reverse=True):
+        for c, overrides in enumerate(configs):
+            job_args = argparse.Namespace(**dict(vars(args), **overrides))
+            for run in range(job_args.runs):
+                jobs.append((data_name, f'{data_name}_c{c}', run, job_args))
+
+    rows = []
+    for (data_name, name, run, job_args), results in run_jobs(jobs, datasets, args):
+        config = int(name.rsplit('_c', 1)[1])
+        train_auc, valid_auc, test_auc, f1 = results['AUC']
+        rows.append(dict(dataset=data_name, config=config, run=run, train_auc=train_auc,
+                         valid_auc=valid_auc, test_auc=test_auc, test_aupr=results['AUPR'][2], f1=f1,
+                         eager_test_auc=results.get('AUC_eager', [None] * 3)[2],
+                         overrides=json.dumps(configs[config], sort_keys=True)))
+
+    table = pd.DataFrame(rows).sort_values(['dataset', 'config', 'run'])
+    table.to_csv(args.results_file, index=False)
+    summary = table.groupby(['dataset', 'config'])[['test_auc', 'test_aupr', 'f1']].agg(['mean', 'std'])
+    print(summary.to_string())
+    telemetry.flush()
+    return table
         
         
    
@@ -293,7 +489,7 @@ def HyperSSL(data_name,args):
             
 
 
-if __name__ == "__main__":
+def build_parser():
     parser = argparse.ArgumentParser(description='HyperSSL')
     parser.add_argument('--device', type=int, default=0)
     parser.add_argument('--decoder_mask', type=str, default='mask', help='mask | nmask') 
@@ -303,19 +499,61 @@ if __name__ == "__main__":
     parser.add_argument('--hidden_channels', type=int, default=128) 
 
     parser.add_argument('--decode_channels', type=int, default=256) 
+    parser.add_argument('--fused_decoder', action='store_true', help='cross-layer decoder without the [E, C*L*L] concatenation')
     parser.add_argument('--dropout', type=float, default=0.5)
-    parser.add_argument('--batch_size', type=int, default=1024)
+    parser.add_argument('--minibatch', action='store_true', help='neighbour-sampled mini-batch training')
+    parser.add_argument('--fanouts', type=str, default='10,10,10,10', help='neighbours sampled per layer, -1 for all')
+    parser.add_argument('--train_batch_size', type=int, default=1024, help='masked edges per mini-batch')
+    parser.add_argument('--infer_batch_size', type=int, default=4096, help='rows per block in layer-wise inference')
+    parser.add_argument('--batch_size', type=int, default=1024, help='edges per scoring batch, 0 derives it from --eval_mem_mb')
+    parser.add_argument('--eval_mem_mb', type=int, default=256, help='memory budget for edge scoring')
     parser.add_argument('--lr', type=float, default=0.0001) 
     parser.add_argument('--epochs', type=int, default=100) 
     parser.add_argument('--mask_ratio', type=float, default=0.7)
-    parser.add_argument('--eval_steps', type=int, default=1)
+    parser.add_argument('--neg_ratio', type=float, default=0.0, help='fresh negatives per masked edge each epoch, 0 reuses the fixed train negatives')
+    parser.add_argument('--prefetch', type=int, default=0, help='epochs of masked graphs built ahead in a worker thread')
+    parser.add_argument('--eval_steps', type=int, default=1, help='validate every eval_steps epochs')
+    parser.add_argument('--val_subsample', type=int, default=0, help='validate on this many pos/neg pairs, 0 uses all')
     parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--parallel_runs', '--parallel-runs', type=int, default=1, help='worker processes for independent runs')
+    parser.add_argument('--threads_per_run', type=int, default=0, help='intra-op threads per worker, 0 splits the cores evenly')
+    parser.add_argument('--checkpoint_dir', type=str, default='checkpoints')
+    parser.add_argument('--run_tag', type=str, default='', help='checkpoint file tag, defaults to start time, pid and a counter')
     parser.add_argument('--patience', type=int, default=50,help='Use attribute or not')
     parser.add_argument('--seed', type=int, default=42, help='Random seed.')
-    parser.add_argument('--data_name', type = str, default = 'pd') #t2d, pd, hd, sch
+    parser.add_argument('--data_name', type = str, default = 'hd') #t2d, pd, hd, sch
+    parser.add_argument('--datasets', type=str, default='', help='comma separated datasets for a batch run, e.g. t2d,pd,hd,sch')
+    parser.add_argument('--configs', type=str, default='', help='JSON file with a list of argument overrides for a batch run')
+    parser.add_argument('--results_file', type=str, default='results.csv')
+    parser.add_argument('--stage1_mode', type=str, default='full', help='full | decoupled (precomputed propagation, mini-batch head)')
+    parser.add_argument('--cache_dir', type=str, default='cache', help='Stage 1 embedding cache, empty to disable')
+    parser.add_argument('--fast_cpu', '--fast-cpu', action='store_true', help='compiled encoder/decoder and bf16 decoder autocast')
+    parser.add_argument('--fast_cpu_tol', type=float, default=0.005, help='AUC gap to the fp32 eager path that raises a PrecisionWarning, negative skips the check')
+    parser.add_argument('--intra_threads', type=int, default=0, help='intra-op threads, 0 keeps the default')
+    parser.add_argument('--interop_threads', type=int, default=0, help='inter-op threads, 0 keeps the default')
+    parser.add_argument('--spmm_backend', type=str, default='torch_sparse', help='torch_sparse | torch_csr | auto (timed on the train graph, --fast_cpu only)')
+    parser.add_argument('--telemetry', type=str, default='', help='JSONL file for stage timers and counters, empty to disable')
+    parser.add_argument('--sample_memory', action='store_true', help='record peak RSS per timer')
+    parser.add_argument('--profile_dir', type=str, default='', help='torch.profiler traces of the --profile_epochs')
+    parser.add_argument('--profile_epochs', type=str, default='', help='epochs to profile, e.g. 2,5-6')
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser()
     warnings.simplefilter('ignore')
     warnings.filterwarnings("ignore")
+    warnings.simplefilter('always', PrecisionWarning)
     
     args = parser.parse_args()
-    HyperSSL('hd',args) # t2d, pd, hd, sch
+    telemetry.configure(args.telemetry, args.profile_dir, parse_steps(args.profile_epochs), args.sample_memory)
+    configure_threads(args.intra_threads, args.interop_threads)
+    if args.datasets:
+        configs = [{}]
+        if args.configs:
+            with open(args.configs) as f:
+                configs = json.load(f)
+        HyperSSLBatch(args.datasets.split(','), configs, args)
+    else:
+        HyperSSL(args.data_name,args) # t2d, pd, hd, sch
 
@@ -0,0 +1,94 @@
+import torch
+
+
+def _binary_curve(pred, true):
+    # one descending sort, then cumulative tp/fp at every distinct threshold
+    pred = pred.detach().reshape(-1).double()
+    true = true.detach().reshape(-1).double()
+    score, order = torch.sort(pred, descending=True, stable=True)
+    true = true[order]
+    cum_tp = torch.cumsum(true, dim=0)
+    last = torch.ones_like(score, dtype=torch.bool)
+    last[:-1] = score[1:] != score[:-1]
+    idx = last.nonzero(as_tuple=False).view(-1)
+    tps = cum_tp[idx]
+    fps = (idx + 1).double() - tps
+    return score, cum_tp, score[idx], tps, fps
+
+
+def _at_threshold(score, cum_tp, num_pos, threshold):
+    # tp/fp of the prediction pred >= threshold, read off the sorted scores
+    k = int(torch.searchsorted(-score, torch.tensor([-threshold], dtype=score.dtype), right=True))
+    tp = float(cum_tp[k - 1]) if k > 0 else 0.0
+    return tp, k - tp, num_pos - tp
+
+
+def binary_metrics(pred, true, threshold=0.55, sweep=False):
+    # AUC, AP, AP of the thresholded prediction and F1 from a single sort;
+    # matches sklearn's roc_auc_score / average_precision_score / f1_score
+    score, cum_tp, thresholds, tps, fps = _binary_curve(pred, true)
+    n = score.numel()
+    num_pos = float(cum_tp[-1]) if n > 0 else 0.0
+    num_neg = n - num_pos
+
+    results = dict()
+    if num_pos > 0 and num_neg > 0:
+        tpr = torch.cat([tps.new_zeros(1), tps / num_pos])
+        fpr = torch.cat([fps.new_zeros(1), fps / num_neg])
+        results['auc'] = float(torch.trapezoid(tpr, fpr))
+    else:
+        results['auc'] = float('nan')
+
+    if num_pos > 0:
+        precision = tps / (tps + fps)
+        recall = tps / num_pos
+        results['ap'] = float(torch.sum(torch.diff(recall, prepend=recall.new_zeros(1)) * precision))
+    else:
+        precision = recall = None
+        results['ap'] = float('nan')
+
+    # a {0, 1} prediction has two operating points: (r, p) at 1 and (1, P/n) at 0
+    tp, fp, fn = _at_threshold(score, cum_tp, num_pos, threshold)
+    base = num_pos / n if n > 0 else 0.0
+    r = tp / num_pos if num_pos > 0 else 0.0
+    p = tp / (tp + fp) if tp + fp > 0 else 0.0
+    results['ap_at'] = r * p + (1 - r) * base
+    results['f1'] = 2 * tp / (2 * tp + fp + fn) if 2 * tp + fp + fn > 0 else 0.0
+
+    if sweep and precision is not None:
+        f1 = 2 * tps / (tps + fps + num_pos)
+        best = int(torch.argmax(f1))
+        results['curve'] = {
+            'threshold': thresholds.float(),
+            'precision': precision.float(),
+            'recall': recall.float(),
+            'f1': f1.float(),
+        }
+        results['best_f1'] = float(f1[best])
+        results['best_threshold'] = float(thresholds[best])
+    return results
+
+
+class MetricAccumulator(object):
+    # collects scored batches; every metric is computed once from the concatenation
+    def __init__(self, threshold=0.55):
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.preds = []
+        self.trues = []
+
+    def update(self, pred, true=None, label=None):
+        pred = pred.detach().reshape(-1).float()
+        if true is None:
+            true = torch.full_like(pred, float(label))
+        self.preds.append(pred)
+        self.trues.append(true.detach().reshape(-1).float())
+
+    def compute(self, sweep=False):
+        if not self.preds:
+            return binary_metrics(torch.empty(0), torch.empty(0), self.threshold, sweep)
+        pred = torch.cat(self.preds)
+        true = torch.cat(self.trues)
+        return binary_metrics(pred, true, self.threshold, sweep)
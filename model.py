@@ -32,6 +32,36 @@ class HGNNP(nn.Module):
         X = self.lkc1(X,hg)
         X = self.lkc2(X,hg)
         return X
+
+    def forward_decoupled(self, PX: torch.Tensor) -> torch.Tensor:
+        # HGNNP with the propagations taken out: PX is the precomputed hg.v2v(X).
+        # The first layer then equals lkc1 (v2v is a row-stochastic mean), and
+        # lkc2 reduces to its linear map.
+        X = self.embed_decoupled(PX)
+        return self.lkc2.theta(X)
+
+    def embed_decoupled(self, PX: torch.Tensor, index=None) -> torch.Tensor:
+        if index is not None:
+            PX = PX[index]
+        X = self.lkc1.act(self.lkc1.theta(PX))
+        if self.lkc1.bn is not None:
+            X = self.lkc1.bn(X)
+        return self.lkc1.drop(X)
+
+    def embed(self, X: torch.Tensor, hg: "dhg.Hypergraph", index=None) -> torch.Tensor:
+        # output of lkc1 only, optionally restricted to the rows in index
+        X = self.lkc1(X,hg)
+        if index is not None:
+            X = X[index]
+        return X
+
+    def embed_rows(self, X: torch.Tensor, hg: "HyperOperator", index: torch.Tensor) -> torch.Tensor:
+        # embed(X, hg, index) computed for those rows alone (eval mode)
+        X = hg.v2v_rows(self.lkc1.theta(X), index, aggr="mean")
+        X = self.lkc1.act(X)
+        if self.lkc1.bn is not None:
+            X = self.lkc1.bn(X)
+        return self.lkc1.drop(X)
         
         
 
@@ -42,12 +72,13 @@ class GCN_mgae(torch.nn.Module):
         super(GCN_mgae, self).__init__()
         self.decoder_mask = decoder_mask
 
+        # adj_t arrives normalized (utils.TrainAdjacency) and changes every epoch
         self.convs = torch.nn.ModuleList()
-        self.convs.append(GCNConv(in_channels, hidden_channels, cached=True, add_self_loops=False))
+        self.convs.append(GCNConv(in_channels, hidden_channels, cached=False, normalize=False, add_self_loops=False))
         for _ in range(num_layers - 2):
             self.convs.append(
-                GCNConv(hidden_channels, hidden_channels, cached=True, add_self_loops=False))
-        self.convs.append(GCNConv(hidden_channels, out_channels, cached=True, add_self_loops=False))
+                GCNConv(hidden_channels, hidden_channels, cached=False, normalize=False, add_self_loops=False))
+        self.convs.append(GCNConv(hidden_channels, out_channels, cached=False, normalize=False, add_self_loops=False))
 
         self.dropout = dropout
 
@@ -75,6 +106,33 @@ class GCN_mgae(torch.nn.Module):
         xx.append(F.relu(x))
         return xx
 
+    def forward_sampled(self, x, adjs, num_targets):
+        # adjs are the bipartite hops of utils.sample_neighborhood, outermost
+        # first; every layer's output is kept for the first num_targets rows
+        xx = []
+        for i, adj_t in enumerate(adjs):
+            x = self.convs[i](x, adj_t)
+            x = F.relu(x)
+            if i < len(adjs) - 1:
+                x = F.dropout(x, p=self.dropout, training=self.training)
+            xx.append(x[:num_targets])
+        return xx
+
+    @torch.no_grad()
+    def inference(self, x, adj_t, batch_size=4096):
+        # layer-wise full-graph pass in row blocks, matches forward in eval mode
+        xx = []
+        for conv in self.convs:
+            h = conv.lin(x)
+            num_rows = adj_t.size(0)
+            x = torch.cat([adj_t.narrow(0, start, min(batch_size, num_rows - start)) @ h
+                           for start in range(0, num_rows, batch_size)], dim=0)
+            if conv.bias is not None:
+                x = x + conv.bias
+            x = F.relu(x)
+            xx.append(x)
+        return xx
+
     def outEmb(self, x, adj_t):
         xx = []
         for conv in self.convs[:-1]:
@@ -116,6 +174,13 @@ class LPD(torch.nn.Module):
         for lin in self.lins:
             lin.reset_parameters()
 
+    def edge_bytes(self, h):
+        # bytes held per scored edge: gathered rows, cross-layer products and their concatenation
+        num_layers, channels = len(h), h[0].size(-1)
+        n = 2 * num_layers * channels + 2 * num_layers * num_layers * channels
+        n += sum(lin.out_features for lin in self.lins)
+        return n * h[0].element_size()
+
     def cross_layer(self, x_1, x_2):
         bi_layer = []
         for i in range(len(x_1)):
@@ -126,6 +191,30 @@ class LPD(torch.nn.Module):
         bi_layer = torch.cat(bi_layer, dim=1)
         return bi_layer
 
+    def fold_query(self, h, query, dst=False):
+        # First Linear with the query side of the cross-layer product folded
+        # into the weight, [Q, H, L*C]; a query then scores any candidate
+        # through one matmul with the candidate's concatenated layers. With dst
+        # the query is the second endpoint of the pair.
+        lin = self.lins[0]
+        num_layers, channels = len(h), h[0].size(-1)
+        weight = lin.weight.view(lin.out_features, num_layers, num_layers, channels)
+        q = torch.stack([h[i][query] for i in range(num_layers)], dim=1)
+        spec = 'hijc,qjc->qhic' if dst else 'hijc,qic->qhjc'
+        return torch.einsum(spec, weight, q).reshape(query.numel(), lin.out_features, num_layers * channels)
+
+    def score_folded(self, folded, h, candidate):
+        # [Q, B] scores of every folded query against every candidate node
+        num_query, hidden, _ = folded.shape
+        x = torch.cat([h[i][candidate] for i in range(len(h))], dim=1)
+        x = (x @ folded.reshape(num_query * hidden, -1).t()).view(-1, num_query, hidden).transpose(0, 1)
+        x = x + self.lins[0].bias
+        for lin in self.lins[1:]:
+            x = F.relu(x)
+            x = F.dropout(x, p=self.dropout, training=self.training)
+            x = lin(x)
+        return torch.sigmoid(x).squeeze(-1)
+
     def forward(self, h, edge):
         #print("h: ",h)
         #print("h.shzpe: ",h.shape)
@@ -138,4 +227,38 @@ class LPD(torch.nn.Module):
             x = F.relu(x)
             x = F.dropout(x, p=self.dropout, training=self.training)
         x = self.lins[-1](x)
-        return torch.sigmoid(x)
\ No newline at end of file
+        return torch.sigmoid(x)
+
+class FusedLPD(LPD):
+    # Same parameters (and state_dict) as LPD. The first Linear is applied per
+    # source layer against its slice of the weight, so the [E, C*L*L]
+    # cross-layer tensor is never materialized; at most [E, C*L] is alive.
+    def edge_bytes(self, h):
+        num_layers, channels = len(h), h[0].size(-1)
+        n = 2 * num_layers * channels + num_layers * channels
+        n += sum(lin.out_features for lin in self.lins)
+        return n * h[0].element_size()
+
+    def fused_first_layer(self, src_x, dst_x):
+        lin = self.lins[0]
+        n_layer, channels = len(src_x), src_x[0].size(-1)
+        dst = torch.stack(dst_x, dim=1)
+        weight = lin.weight.view(lin.out_features, n_layer, n_layer * channels)
+        x = None
+        for i in range(n_layer):
+            xi = (src_x[i].unsqueeze(1) * dst).reshape(dst.size(0), -1)
+            if x is None:
+                x = F.linear(xi, weight[:, i], lin.bias)
+            else:
+                x = x + F.linear(xi, weight[:, i])
+        return x
+
+    def forward(self, h, edge):
+        src_x = [h[i][edge[0]] for i in range(len(h))]
+        dst_x = [h[i][edge[1]] for i in range(len(h))]
+        x = self.fused_first_layer(src_x, dst_x)
+        for lin in self.lins[1:]:
+            x = F.relu(x)
+            x = F.dropout(x, p=self.dropout, training=self.training)
+            x = lin(x)
+        return torch.sigmoid(x)
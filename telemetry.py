@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import contextlib
+import torch
+
+_NULL = contextlib.nullcontext()
+
+
+class PeakRSS(object):
+    # Samples the resident set size in a background thread. Every open window
+    # (start() .. stop()) tracks its own maximum, so windows may nest.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.has_statm = os.path.exists('/proc/self/statm')
+        self.windows = dict()
+        self.lock = threading.Lock()
+        self.halt = threading.Event()
+        if self.has_statm:
+            threading.Thread(target=self.loop, daemon=True).start()
+
+    def current(self):
+        if self.has_statm:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self.page_size
+        # no /proc: process-lifetime high-water mark (KiB on Linux, bytes on macOS)
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def loop(self):
+        while not self.halt.wait(self.interval):
+            rss = self.current()
+            with self.lock:
+                for key in self.windows:
+                    self.windows[key] = max(self.windows[key], rss)
+
+    def start(self):
+        key = object()
+        with self.lock:
+            self.windows[key] = self.current()
+        return key
+
+    def stop(self, key):
+        rss = self.current()
+        with self.lock:
+            return max(self.windows.pop(key), rss)
+
+    def close(self):
+        self.halt.set()
+
+
+class Telemetry(object):
+    # Named timers and counters, one JSON line per closed timer or event.
+    # Disabled (the default) every call returns right away: timer() hands back
+    # a shared null context and count() is a single attribute test.
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.file = None
+        self.profile_dir = None
+        self.profile_steps = set()
+        self.rss = None
+        self.totals = dict()
+        self.counters = dict()
+        self.lock = threading.Lock()
+
+    def configure(self, path=None, profile_dir=None, profile_steps=(), sample_memory=False):
+        self.close()
+        self.path = path or None
+        self.enabled = self.path is not None
+        self.profile_dir = profile_dir or None
+        self.profile_steps = set(profile_steps)
+        self.rss = PeakRSS() if self.enabled and sample_memory else None
+        self.totals = dict()
+        self.counters = dict()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # append mode, so workers can share the file
+            self.file = open(self.path, 'a')
+
+    def config(self):
+        # picklable settings for spawned workers
+        return dict(path=self.path, profile_dir=self.profile_dir, profile_steps=sorted(self.profile_steps),
+                    sample_memory=self.rss is not None)
+
+    def write(self, record):
+        record.update(time=time.time(), pid=os.getpid())
+        line = json.dumps(record) + '\n'
+        # one flushed write per line keeps the lines of concurrent workers whole
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def timer(self, name, **fields):
+        if not self.enabled:
+            return _NULL
+        return self._timer(name, fields)
+
+    @contextlib.contextmanager
+    def _timer(self, name, fields):
+        key = self.rss.start() if self.rss is not None else None
+        start = time.perf_counter()
+        try:
+            with torch.profiler.record_function(name):
+                yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = dict(kind='timer', name=name, seconds=seconds, **fields)
+            if key is not None:
+                record['peak_rss_mb'] = self.rss.stop(key) / 2**20
+            with self.lock:
+                count, total = self.totals.get(name, (0, 0.0))
+                self.totals[name] = (count + 1, total + seconds)
+            self.write(record)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def event(self, name, **fields):
+        if self.enabled:
+            self.write(dict(kind='event', name=name, **fields))
+
+    def profile(self, name, step):
+        # torch.profiler capture of one step, exported as a Chrome trace
+        if self.profile_dir is None or step not in self.profile_steps:
+            return _NULL
+        return self._profile(name, step)
+
+    @contextlib.contextmanager
+    def _profile(self, name, step):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                    record_shapes=True, profile_memory=True) as prof:
+            yield
+        prof.export_chrome_trace(os.path.join(self.profile_dir, f'{name}_step{step}_{os.getpid()}.json'))
+
+    def summary(self):
+        timers = {name: dict(count=count, seconds=total, mean=total / count)
+                  for name, (count, total) in self.totals.items()}
+        return dict(timers=timers, counters=dict(self.counters))
+
+    def flush(self):
+        # totals of this process so far
+        if self.enabled:
+            self.write(dict(kind='summary', **self.summary()))
+
+    def close(self):
+        if self.rss is not None:
+            self.rss.close()
+            self.rss = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def parse_steps(spec):
+    # "3,5,10-12" -> {3, 5, 10, 11, 12}
+    steps = set()
+    for part in filter(None, spec.split(',')):
+        lo, _, hi = part.partition('-')
+        steps.update(range(int(lo), int(hi or lo) + 1))
+    return steps
+
+
+telemetry = Telemetry()
@@ -0,0 +1,38 @@
+import torch
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+from torch_geometric.utils import to_undirected
+from utils import TrainAdjacency
+
+NUM_NODES = 50
+
+
+def train_edges(num_edges=150, seed=0):
+    # distinct (i, j>i) pairs as a [E, 2] train split
+    generator = torch.Generator().manual_seed(seed)
+    i, j = torch.randint(NUM_NODES, (2, num_edges), generator=generator)
+    keys = torch.unique((torch.min(i, j) * NUM_NODES + torch.max(i, j))[i != j])
+    return torch.stack([keys // NUM_NODES, keys % NUM_NODES], dim=1)
+
+
+def gcn_dense(train_edge):
+    # D^-1/2 (A + I) D^-1/2 as GCNConv(normalize=True) computes it
+    edge_index = to_undirected(train_edge.t(), num_nodes=NUM_NODES)
+    edge_index, value = gcn_norm(edge_index, num_nodes=NUM_NODES, add_self_loops=True)
+    dense = torch.zeros(NUM_NODES, NUM_NODES)
+    dense[edge_index[0], edge_index[1]] = value
+    return dense
+
+
+def test_full_adjacency_matches_gcn_norm():
+    train_edge = train_edges()
+    adj, _ = TrainAdjacency(train_edge, NUM_NODES).adj()
+    assert torch.allclose(adj.to_dense(), gcn_dense(train_edge), atol=1e-6)
+
+
+def test_masked_adjacency_matches_gcn_norm():
+    train_edge = train_edges()
+    adj, _, masked = TrainAdjacency(train_edge, NUM_NODES).mask(0.7, torch.Generator().manual_seed(3))
+    dropped = {tuple(e) for e in masked.t().tolist()}
+    kept = torch.tensor([e for e in train_edge.tolist() if tuple(e) not in dropped])
+    assert len(dropped) == int(train_edge.size(0) * 0.7)
+    assert torch.allclose(adj.to_dense(), gcn_dense(kept), atol=1e-6)
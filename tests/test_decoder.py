@@ -0,0 +1,12 @@
+import torch
+from model import LPD, FusedLPD
+
+
+def test_fused_decoder_matches_lpd():
+    torch.manual_seed(0)
+    lpd = LPD(16, 32, 1, 3, 2, 0.0).eval()
+    fused = FusedLPD(16, 32, 1, 3, 2, 0.0).eval()
+    fused.load_state_dict(lpd.state_dict())
+    h = [torch.randn(50, 16) for _ in range(3)]
+    edge = torch.randint(50, (2, 200))
+    assert torch.allclose(fused(h, edge), lpd(h, edge), atol=1e-6)
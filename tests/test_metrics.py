@@ -0,0 +1,29 @@
+import torch
+from sklearn.metrics import roc_auc_score, average_precision_score, f1_score
+from metrics import binary_metrics, MetricAccumulator
+
+
+def scores(n=500, seed=0):
+    # labels and scores rounded to a coarse grid so ties are exercised
+    generator = torch.Generator().manual_seed(seed)
+    true = (torch.rand(n, generator=generator) < 0.4).float()
+    pred = torch.round((0.3 * true + 0.7 * torch.rand(n, generator=generator)) * 20) / 20
+    return pred, true
+
+
+def test_binary_metrics_match_sklearn():
+    pred, true = scores()
+    hard = (pred >= 0.55).float()
+    results = binary_metrics(pred, true, threshold=0.55)
+    assert abs(results['auc'] - roc_auc_score(true, pred)) < 1e-9
+    assert abs(results['ap'] - average_precision_score(true, pred)) < 1e-9
+    assert abs(results['ap_at'] - average_precision_score(true, hard)) < 1e-9
+    assert abs(results['f1'] - f1_score(true, hard)) < 1e-9
+
+
+def test_accumulator_matches_single_call():
+    pred, true = scores()
+    acc = MetricAccumulator()
+    for p, t in zip(pred.split(64), true.split(64)):
+        acc.update(p, t)
+    assert acc.compute() == binary_metrics(pred, true)
@@ -0,0 +1,51 @@
+import itertools
+import torch
+from torch_geometric.data import Data
+from utils import edge_keys, enumerate_neg_edges, sample_neg_edges, edge_split_direct
+
+
+def random_graph(num_nodes, num_edges, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(num_nodes, (2, num_edges), generator=generator)
+
+
+def complement(edge_index, num_nodes):
+    # (i, j>i) non-edges in row-major order, by brute force
+    edges = {tuple(sorted(e)) for e in edge_index.t().tolist()}
+    return [pair for pair in itertools.combinations(range(num_nodes), 2) if pair not in edges]
+
+
+def test_enumerate_is_the_complement():
+    edge_index = random_graph(40, 200)
+    neg = enumerate_neg_edges(edge_index, 40, chunk_size=37)
+    assert [tuple(e) for e in neg.t().tolist()] == complement(edge_index, 40)
+
+
+def check_sample(num_nodes, num_edges, num_samples):
+    edge_index = random_graph(num_nodes, num_edges)
+    free = complement(edge_index, num_nodes)
+    keys = edge_keys(edge_index, num_nodes)
+    neg = sample_neg_edges(keys, num_nodes, num_samples, torch.Generator().manual_seed(1))
+    pairs = [tuple(e) for e in neg.t().tolist()]
+    assert len(pairs) == min(num_samples, len(free))
+    assert len(set(pairs)) == len(pairs)
+    assert set(pairs) <= set(free)
+
+
+def test_sample_by_rejection():
+    check_sample(100, 300, 500)
+
+
+def test_sample_dense_graph():
+    # more than half of the free pairs requested: drawn from the enumerated complement
+    check_sample(30, 300, 400)
+
+
+def test_split_negatives_avoid_positives():
+    keys = edge_keys(random_graph(60, 400), 60)
+    data = Data(edge_index=torch.stack([keys // 60, keys % 60], dim=0), num_nodes=60)
+    positives = {tuple(e) for e in data.edge_index.t().tolist()}
+    split_edge = edge_split_direct(data)
+    negatives = [tuple(sorted(e)) for split in split_edge for e in split_edge[split]['edge_neg'].tolist()]
+    assert len(set(negatives)) == len(negatives)
+    assert not set(negatives) & positives
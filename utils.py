@@ -1,34 +1,320 @@
+import os
 import sys
 import math
+import queue
+import threading
 from tqdm import tqdm
 import random
 import numpy as np
 import scipy.sparse as ssp
 from scipy.sparse.csgraph import shortest_path
 import torch
-from sklearn.metrics import roc_auc_score, average_precision_score, f1_score
 from torch_geometric.data import DataLoader
 from torch_geometric.data import Data
 from torch_sparse import SparseTensor
 from torch_geometric.utils import (negative_sampling, add_self_loops,train_test_split_edges,to_undirected)
 import scipy.io as scio
-
-
-def random_edge_mask(args, split_edge, device, num_nodes):
-    edge_index = split_edge['train']['edge']
-    num_edge = len(edge_index)
-    index = np.arange(num_edge)
-    np.random.shuffle(index)
-    mask_num = int(num_edge * args.mask_ratio)
-    pre_index = torch.from_numpy(index[0:-mask_num])
-    mask_index = torch.from_numpy(index[-mask_num:])
-    edge_index_train = edge_index[pre_index].t()
-    edge_index_mask = edge_index[mask_index].t()
-
-    edge_index = to_undirected(edge_index_train)
-    
-    edge_index, _ = add_self_loops(edge_index, num_nodes=num_nodes)
-    adj = SparseTensor.from_edge_index(edge_index).t()
+from metrics import binary_metrics
+from telemetry import telemetry
+
+
+def edge_keys(edge_index, num_nodes):
+    # sorted unique int64 keys i*N+j (i<j) of the undirected edges, self loops dropped
+    row, col = edge_index[0].long(), edge_index[1].long()
+    lo, hi = torch.min(row, col), torch.max(row, col)
+    mask = lo != hi
+    return torch.unique(lo[mask] * num_nodes + hi[mask])
+
+
+def contains_keys(sorted_keys, keys):
+    if sorted_keys.numel() == 0:
+        return torch.zeros(keys.shape, dtype=torch.bool, device=keys.device)
+    pos = torch.searchsorted(sorted_keys, keys).clamp_(max=sorted_keys.numel() - 1)
+    return sorted_keys[pos] == keys
+
+
+def sample_neg_edges(keys, num_nodes, num_samples, generator=None):
+    # draws distinct upper-triangular non-edges by rejection against the sorted key index
+    num_pairs = num_nodes * (num_nodes - 1) // 2
+    num_free = num_pairs - keys.numel()
+    num_samples = min(int(num_samples), num_free)
+    if num_samples <= 0:
+        return torch.empty(2, 0, dtype=torch.long)
+    if 2 * num_samples > num_free:
+        # too dense for rejection to pay off, permute the full complement instead
+        neg = enumerate_neg_edges(None, num_nodes, keys=keys)
+        perm = torch.randperm(neg.size(1), generator=generator)[:num_samples]
+        return neg[:, perm]
+
+    out = keys.new_empty(0)
+    while out.numel() < num_samples:
+        need = num_samples - out.numel()
+        n = int(need * num_pairs / (num_free - out.numel()) * 1.1) + 16
+        i = torch.randint(num_nodes, (n,), generator=generator)
+        j = torch.randint(num_nodes, (n,), generator=generator)
+        lo, hi = torch.min(i, j), torch.max(i, j)
+        cand = (lo * num_nodes + hi)[lo != hi]
+        cand = torch.cat([out, cand[~contains_keys(keys, cand)]])
+        # keep the first draw of every key so the sample order stays random
+        uniq, inv = torch.unique(cand, return_inverse=True)
+        first = torch.full((uniq.numel(),), cand.numel(), dtype=torch.long)
+        first.scatter_reduce_(0, inv, torch.arange(cand.numel()), reduce='amin')
+        out = cand[first.sort().values]
+    out = out[:num_samples]
+    return torch.stack([out // num_nodes, out % num_nodes], dim=0)
+
+
+def enumerate_neg_edges(edge_index, num_nodes, num_samples=None, chunk_size=1 << 22,
+                        generator=None, keys=None):
+    # all (i, j>i) pairs that are not edges, row-major, from a sparse edge_index.
+    # Rows are processed in blocks of about chunk_size candidate pairs, so no
+    # N x N buffer is ever allocated. With num_samples only that many random
+    # non-edges are drawn.
+    if keys is None:
+        keys = edge_keys(edge_index, num_nodes)
+    if num_samples is not None:
+        return sample_neg_edges(keys, num_nodes, num_samples, generator)
+
+    counts = torch.arange(num_nodes - 1, -1, -1)
+    ends = torch.cumsum(counts, dim=0)
+    rows, cols = [], []
+    start = 0
+    while start < num_nodes - 1:
+        done = int(ends[start - 1]) if start > 0 else 0
+        end = int(torch.searchsorted(ends, done + chunk_size, right=True))
+        end = min(max(end, start + 1), num_nodes)
+
+        r = torch.arange(start, end)
+        cnt = counts[start:end]
+        row = torch.repeat_interleave(r, cnt)
+        offset = torch.repeat_interleave(torch.cumsum(cnt, dim=0) - cnt, cnt)
+        col = torch.arange(row.numel()) - offset + row + 1
+
+        lo = torch.searchsorted(keys, start * num_nodes)
+        hi = torch.searchsorted(keys, end * num_nodes)
+        keep = ~contains_keys(keys[lo:hi], row * num_nodes + col)
+        rows.append(row[keep])
+        cols.append(col[keep])
+        start = end
+
+    if not rows:
+        return torch.empty(2, 0, dtype=torch.long)
+    return torch.stack([torch.cat(rows), torch.cat(cols)], dim=0)
+
+
+class TrainAdjacency(object):
+    # Undirected train adjacency with self loops, built once as a CSR. Masking
+    # an epoch only selects CSR entries, and the symmetric normalization
+    # D^-1/2 A D^-1/2 is refreshed from the degree deltas of the dropped edges.
+    def __init__(self, train_edge, num_nodes):
+        self.train_edge = train_edge
+        self.num_nodes = num_nodes
+        row, col = train_edge[:, 0].long(), train_edge[:, 1].long()
+        lo, hi = torch.min(row, col), torch.max(row, col)
+        pair_key, self.edge_pair = torch.unique(lo * num_nodes + hi, return_inverse=True)
+        self.pair_a, self.pair_b = pair_key // num_nodes, pair_key % num_nodes
+        self.pair_loop = self.pair_a == self.pair_b
+
+        # both directions of every pair plus one self loop per node
+        pair_id = torch.arange(pair_key.numel())[~self.pair_loop]
+        a, b = self.pair_a[~self.pair_loop], self.pair_b[~self.pair_loop]
+        nodes = torch.arange(num_nodes)
+        row = torch.cat([a, b, nodes])
+        col = torch.cat([b, a, nodes])
+        entry_pair = torch.cat([pair_id, pair_id, torch.full((num_nodes,), -1, dtype=torch.long)])
+        order = torch.argsort(row * num_nodes + col)
+        self.row, self.col, self.entry_pair = row[order], col[order], entry_pair[order]
+        self.entry_loop = self.entry_pair < 0
+
+        count = torch.bincount(self.row, minlength=num_nodes)
+        self.rowptr = torch.cat([count.new_zeros(1), torch.cumsum(count, dim=0)])
+        self.deg = count.float()
+
+    def adj(self, pair_keep=None):
+        num_nodes = self.num_nodes
+        if pair_keep is None:
+            deg = self.deg
+            keep = torch.ones_like(self.entry_loop)
+        else:
+            dropped = ~pair_keep & ~self.pair_loop
+            ends = torch.cat([self.pair_a[dropped], self.pair_b[dropped]])
+            deg = self.deg - torch.bincount(ends, minlength=num_nodes)
+            keep = self.entry_loop | pair_keep[self.entry_pair.clamp(min=0)]
+
+        row, col = self.row[keep], self.col[keep]
+        dinv = deg.pow(-0.5)
+        dinv.masked_fill_(dinv == float('inf'), 0)
+        value = dinv[row] * dinv[col]
+        kept = torch.cat([keep.new_zeros(1, dtype=torch.long), torch.cumsum(keep.long(), dim=0)])
+        adj = SparseTensor(rowptr=kept[self.rowptr], col=col, value=value,
+                           sparse_sizes=(num_nodes, num_nodes), is_sorted=True)
+        return adj, torch.stack([row, col], dim=0)
+
+    def mask(self, mask_ratio, generator=None):
+        num_edge = self.train_edge.size(0)
+        perm = torch.randperm(num_edge, generator=generator)
+        mask_num = int(num_edge * mask_ratio)
+        pre_index, mask_index = perm[:num_edge - mask_num], perm[num_edge - mask_num:]
+        pair_keep = torch.zeros_like(self.pair_loop)
+        pair_keep[self.edge_pair[pre_index]] = True
+        adj, edge_index = self.adj(pair_keep)
+        return adj, edge_index, self.train_edge[mask_index].t()
+
+
+def negative_key_index(split_edge, num_nodes):
+    # Sorted keys of every pair a fresh train negative must avoid: the
+    # positives of all splits and the fixed valid/test negatives.
+    edges = [split_edge[split]['edge'] for split in ['train', 'valid', 'test']]
+    edges += [split_edge[split]['edge_neg'] for split in ['valid', 'test']]
+    return edge_keys(torch.cat(edges, dim=0).t(), num_nodes)
+
+
+class MaskPrefetcher(object):
+    # Hands out the masked train graph of each epoch. Every epoch draws from its
+    # own generator seeded by (seed, epoch), so the graphs do not depend on the
+    # prefetch depth; with depth > 0 a worker thread builds up to depth epochs
+    # ahead while the current one trains. With neg_ratio > 0 each epoch also
+    # gets neg_ratio fresh negatives per masked edge, sampled against neg_keys;
+    # otherwise its negatives are None and the fixed train negatives are used.
+    def __init__(self, train_adj, mask_ratio, seed, epochs, depth=0, neg_keys=None, neg_ratio=0.0):
+        self.train_adj = train_adj
+        self.mask_ratio = mask_ratio
+        self.neg_keys = neg_keys
+        self.neg_ratio = neg_ratio
+        self.seed = seed
+        self.epochs = epochs
+        self.depth = depth
+        self.queue = None
+        self.stopped = threading.Event()
+        if depth > 0:
+            self.queue = queue.Queue(maxsize=depth)
+            self.thread = threading.Thread(target=self._produce, daemon=True)
+            self.thread.start()
+
+    def build(self, epoch):
+        generator = torch.Generator().manual_seed((self.seed * 1000003 + epoch) % (2**63))
+        with telemetry.timer('mask.build', epoch=epoch):
+            adj, edge_index, masked = self.train_adj.mask(self.mask_ratio, generator)
+        neg = None
+        if self.neg_ratio > 0:
+            with telemetry.timer('negatives.sample', epoch=epoch):
+                num = math.ceil(self.neg_ratio * masked.size(1))
+                neg = sample_neg_edges(self.neg_keys, self.train_adj.num_nodes, num, generator)
+        return adj, edge_index, masked, neg
+
+    def _produce(self):
+        for epoch in range(1, 1 + self.epochs):
+            try:
+                item = (epoch, self.build(epoch))
+            except Exception as e:
+                item = (epoch, e)
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if self.stopped.is_set() or isinstance(item[1], Exception):
+                return
+
+    def get(self, epoch):
+        if self.queue is None:
+            return self.build(epoch)
+        produced, item = self.queue.get()
+        assert produced == epoch, 'epochs must be consumed in order'
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        self.stopped.set()
+        if self.queue is not None:
+            self.thread.join()
+            self.queue = None
+
+
+def snapshot(module):
+    return {k: v.detach().clone() for k, v in module.state_dict().items()}
+
+
+class CheckpointWriter(object):
+    # Writes checkpoints from a background thread. A state submitted for a path
+    # that is still waiting replaces the queued one, so a burst of improvements
+    # costs a single write. Files are written to a temporary name and renamed.
+    def __init__(self):
+        self.pending = dict()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.error = None
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def submit(self, path, state):
+        with self.cond:
+            self.pending[path] = state
+            self.cond.notify()
+
+    def _write(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                path = next(iter(self.pending))
+                state = self.pending.pop(path)
+            try:
+                tmp = path + '.tmp'
+                torch.save(state, tmp)
+                os.replace(tmp, path)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def sample_neighborhood(adj_t, nodes, fanouts):
+    # Samples len(fanouts) hops around nodes (-1 keeps every neighbour). Returns
+    # the node ids, with nodes first, and one bipartite adjacency per layer,
+    # outermost hop first, carrying the normalized values of adj_t. A row that
+    # kept k of its d entries is scaled by d / k so its aggregate matches the
+    # full-graph pass in expectation.
+    degree = adj_t.storage.rowcount()
+    n_id, adjs = nodes, []
+    for size in fanouts:
+        target = n_id
+        sub, n_id = adj_t.sample_adj(target, size, replace=False)
+        row, col, value = sub.coo()
+        scale = degree[target].float() / sub.storage.rowcount().clamp(min=1).float()
+        adjs.append(sub.set_value(value * scale[row], layout='coo'))
+    return n_id, adjs[::-1]
+
+
+def share_memory(*objs):
+    # moves every tensor reachable through dicts, lists and plain objects to shared memory
+    for obj in objs:
+        if isinstance(obj, torch.Tensor):
+            obj.share_memory_()
+        elif isinstance(obj, dict):
+            share_memory(*obj.values())
+        elif isinstance(obj, (list, tuple)):
+            share_memory(*obj)
+        elif isinstance(obj, Data):
+            share_memory(*[v for _, v in obj])
+        elif hasattr(obj, '__dict__'):
+            share_memory(*vars(obj).values())
+
+
+def random_edge_mask(args, split_edge, device, num_nodes, train_adj=None):
+    if train_adj is None:
+        train_adj = TrainAdjacency(split_edge['train']['edge'], num_nodes)
+    adj, edge_index, edge_index_mask = train_adj.mask(args.mask_ratio)
     return adj, edge_index, edge_index_mask.to(device) 
 
 
@@ -71,15 +357,9 @@ def train_test_split_edges_direct(data, val_ratio: float = 0.05,
     data.train_pos_edge_index = torch.stack([r, c], dim=0)
     
 
-    # Negative edges.
-    neg_adj_mask = torch.ones(num_nodes, num_nodes, dtype=torch.uint8)
-    neg_adj_mask = neg_adj_mask.triu(diagonal=1).to(torch.bool)
-    neg_adj_mask[row, col] = 0
-
-    neg_row, neg_col = neg_adj_mask.nonzero(as_tuple=False).t()
-    #perm = torch.randperm(neg_row.size(0))[:n_v + n_t]
-    perm = torch.randperm(neg_row.size(0))[:(row.size(0)*1)]          
-    neg_row, neg_col = neg_row[perm], neg_col[perm]
+    # Negative edges, drawn against the edge-key index instead of a dense mask.
+    keys = edge_keys(torch.stack([row, col], dim=0), num_nodes)
+    neg_row, neg_col = sample_neg_edges(keys, num_nodes, row.size(0)*1)
 
     
     n_v = n_v*1
@@ -149,50 +429,140 @@ def edge_split_direct(dataset, fast_split=False, val_ratio=0.05, test_ratio=0.1)
     return split_edge
 
 
-def evaluate_auc(train_pred, train_true, val_pred, val_true, test_pred, test_true):
-    
-    train_auc = roc_auc_score(train_true, train_pred)
-    valid_auc = roc_auc_score(val_true, val_pred)
-    test_auc = roc_auc_score(test_true, test_pred)
-    train_ap = average_precision_score(train_true, train_pred)
-    valid_ap = average_precision_score(val_true, val_pred)
-    test_ap = average_precision_score(test_true, test_pred)
-    
-    
-    pred = test_pred.clone().detach()
-    labels = test_true.clone().detach()
-    threshold = 0.55
-    for i in range(train_pred.shape[0]):
-        if train_pred[i] >= threshold:
-            train_pred[i] = 1
-        else:
-            train_pred[i] = 0
-    
-     
-    for i in range(val_pred.shape[0]):
-        if val_pred[i] >= threshold:
-            val_pred[i] = 1
-        else:
-            val_pred[i] = 0
-            
-    
-    for i in range(test_pred.shape[0]):
-        if test_pred[i] >= threshold:
-            test_pred[i] = 1
-        else:
-            test_pred[i] = 0
-            
-    train_aps = average_precision_score(train_true, train_pred)
-    valid_aps = average_precision_score(val_true, val_pred)
-    test_aps = average_precision_score(test_true, test_pred)
-    
-    
+def update_split(split_edge, edge_index, num_nodes, val_ratio=0.05, test_ratio=0.1, generator=None):
+    # Split of an updated graph that stays consistent with split_edge: pairs
+    # that survived keep their split, removed pairs are dropped and new pairs
+    # are divided at val_ratio / test_ratio. Negatives that became edges are
+    # dropped and every split is refilled to as many negatives as positives.
+    splits = ['train', 'valid', 'test']
+    row, col = edge_index[0].long(), edge_index[1].long()
+    lo, hi = torch.min(row, col), torch.max(row, col)
+    row, col, key = row[lo != hi], col[lo != hi], (lo * num_nodes + hi)[lo != hi]
+    pos_keys, inv = torch.unique(key, return_inverse=True)
+    first = torch.full((pos_keys.numel(),), key.numel(), dtype=torch.long)
+    first.scatter_reduce_(0, inv, torch.arange(key.numel()), reduce='amin')
+    pairs = torch.stack([row[first], col[first]], dim=1)
+
+    def pair_keys(edge):
+        edge = edge.long()
+        return torch.min(edge[:, 0], edge[:, 1]) * num_nodes + torch.max(edge[:, 0], edge[:, 1])
+
+    new_split = {split: dict() for split in splits}
+    taken = torch.zeros(pos_keys.numel(), dtype=torch.bool)
+    for split in splits:
+        old_keys = pair_keys(split_edge[split]['edge'])
+        present = contains_keys(pos_keys, old_keys)
+        new_split[split]['edge'] = split_edge[split]['edge'][present]
+        taken |= contains_keys(torch.unique(old_keys[present]), pos_keys)
+
+    fresh = pairs[~taken][torch.randperm(int((~taken).sum()), generator=generator)]
+    n_v = int(math.floor(val_ratio * fresh.size(0)))
+    n_t = int(math.floor(test_ratio * fresh.size(0)))
+    parts = {'valid': fresh[:n_v], 'test': fresh[n_v:n_v + n_t], 'train': fresh[n_v + n_t:]}
+    for split in splits:
+        new_split[split]['edge'] = torch.cat([new_split[split]['edge'], parts[split]], dim=0)
+
+    kept = dict()
+    for split in splits:
+        neg = split_edge[split]['edge_neg']
+        neg = neg[~contains_keys(pos_keys, pair_keys(neg))]
+        kept[split] = neg[:new_split[split]['edge'].size(0)]
+    avoid = torch.unique(torch.cat([pos_keys] + [pair_keys(kept[split]) for split in splits]))
+    need = [new_split[split]['edge'].size(0) - kept[split].size(0) for split in splits]
+    drawn = sample_neg_edges(avoid, num_nodes, sum(need), generator).t().split(need)
+    for split, neg in zip(splits, drawn):
+        new_split[split]['edge_neg'] = torch.cat([kept[split], neg.to(kept[split].dtype)], dim=0)
+    return new_split
+
+
+def edge_bytes(predictor, h):
+    if hasattr(predictor, 'edge_bytes'):
+        return predictor.edge_bytes(h)
+    num_layers, channels = len(h), h[0].size(-1)
+    return 2 * num_layers * num_layers * channels * h[0].element_size()
+
+
+def score_edges(predictor, h, edges, mem_budget=256 * 2**20, batch_size=None):
+    # Scores a dict of named [E, 2] edge tensors in one pass. All edges are laid
+    # out back to back and fed to the predictor in contiguous slices whose size
+    # follows from mem_budget (bytes) unless batch_size is given; the scores land
+    # in a single preallocated buffer on the device of h.
+    device = h[0].device
+    names = list(edges.keys())
+    sizes = [edges[name].size(0) for name in names]
+    all_edges = torch.cat([edges[name].to(device) for name in names], dim=0)
+    total = all_edges.size(0)
+    out = torch.empty(total, dtype=h[0].dtype, device=device)
+    if not batch_size:
+        batch_size = max(1, int(mem_budget // edge_bytes(predictor, h)))
+    for start in range(0, total, batch_size):
+        edge = all_edges[start:start + batch_size].t()
+        out[start:start + batch_size] = predictor(h, edge).view(-1)
+    return dict(zip(names, out.split(sizes)))
+
+
+def query_blocks(predictor, h, num_queries, mem_budget=256 * 2**20, query_batch=None):
+    # (query batch, candidate block) sizes for fold_query / score_folded: half
+    # the budget for the folded weights, half for the [Q, B, hidden] activations
+    size = h[0].element_size()
+    hidden = sum(lin.out_features for lin in predictor.lins)
+    fold_bytes = predictor.lins[0].weight.numel() // len(h) * size
+    if not query_batch:
+        query_batch = max(1, min(num_queries, int(mem_budget // 2 // fold_bytes)))
+    block = max(1, int(mem_budget // 2 // (query_batch * (2 * hidden * size + 16))))
+    return query_batch, block
+
+
+@torch.no_grad()
+def topk_partners(predictor, h, query, k, known_keys=None, exclude_self=True, symmetric=False,
+                  mem_budget=256 * 2**20, query_batch=None):
+    # Top-k partners of every query node against all N nodes. Candidates are
+    # scored in [Q, B] blocks and merged into a running top-k per query, so
+    # only one block of scores is alive. Pairs whose key i*N+j (i<j) is in
+    # known_keys are skipped, as is the query itself with exclude_self. With
+    # symmetric the score is the mean over both orientations of the pair.
+    # Returns scores and partner ids, [len(query), k]; skipped slots are -inf.
+    num_nodes = h[0].size(0)
+    device = h[0].device
+    query = query.to(device)
+    k = min(k, num_nodes)
+    query_batch, block = query_blocks(predictor, h, query.numel(), mem_budget, query_batch)
+    block = max(block, k)
+    scores, partners = [], []
+    for q in query.split(query_batch):
+        folded = predictor.fold_query(h, q)
+        folded_dst = predictor.fold_query(h, q, dst=True) if symmetric else None
+        best = h[0].new_empty(q.numel(), 0)
+        best_id = torch.empty(q.numel(), 0, dtype=torch.long, device=device)
+        for start in range(0, num_nodes, block):
+            cand = torch.arange(start, min(start + block, num_nodes), device=device)
+            s = predictor.score_folded(folded, h, cand)
+            if symmetric:
+                s = (s + predictor.score_folded(folded_dst, h, cand)) / 2
+            if exclude_self:
+                s.masked_fill_(q.view(-1, 1) == cand.view(1, -1), float('-inf'))
+            if known_keys is not None:
+                lo = torch.min(q.view(-1, 1), cand.view(1, -1))
+                hi = torch.max(q.view(-1, 1), cand.view(1, -1))
+                s.masked_fill_(contains_keys(known_keys, lo * num_nodes + hi), float('-inf'))
+            s = torch.cat([best, s], dim=1)
+            ids = torch.cat([best_id, cand.view(1, -1).expand(q.numel(), -1)], dim=1)
+            best, pos = s.topk(min(k, s.size(1)), dim=1)
+            best_id = ids.gather(1, pos)
+        scores.append(best)
+        partners.append(best_id)
+    return torch.cat(scores, dim=0), torch.cat(partners, dim=0)
+
+
+def evaluate_auc(train_pred, train_true, val_pred, val_true, test_pred, test_true, threshold=0.55):
     
-    f1_test = f1_score(test_true,test_pred)
+    train = binary_metrics(train_pred, train_true, threshold)
+    valid = binary_metrics(val_pred, val_true, threshold)
+    test = binary_metrics(test_pred, test_true, threshold)
     
     results = dict()
-    results['AUC'] = (train_auc, valid_auc, test_auc,f1_test)
-    results['AUPR'] = (train_ap, valid_ap, test_ap,f1_test) 
+    results['AUC'] = (train['auc'], valid['auc'], test['auc'], test['f1'])
+    results['AUPR'] = (train['ap'], valid['ap'], test['ap'], test['f1']) 
     
     return results
 